@@ -1,587 +1,3856 @@
-# -*- coding: latin-1 -*-
-import random
-import sys
-import os
-import pickle
-
-sys.path.append("..")  # so other modules can be found in parent dir
-from Player import *
-from Constants import *
-from Construction import CONSTR_STATS
-from Ant import UNIT_STATS
-from Move import Move
-from math import sqrt
-from GameState import addCoords
-from AIPlayerUtils import *
-from pprint import pprint
-
-
-##
-# AIPlayer
-# Description: The responsbility of this class is to interact with the game by
-# deciding a valid move based on a given game state. This class has methods that
-# will be implemented by students in Dr. Nuxoll's AI course.
-#
-# Variables:
-#   playerId - The id of the player.
-##
-class AIPlayer(Player):
-    # __init__
-    # Description: Creates a new Player
-    #
-    # Parameters:
-    #   inputPlayerId - The id to give the new player (int)
-    ##
-    def __init__(self, inputPlayerId):
-        super(AIPlayer, self).__init__(inputPlayerId, "HW 6 Agent")
-
-        # Tweaking these should definitely alter the success of the AI
-        self.NUM_DESIRED_DRONES = 1
-        self.NUM_DESIRED_WORKERS = 2
-        self.MIN_DESIRED_FOOD = 2
-
-        # We would like to know where our tunnel is
-        self.myTunnel = None
-
-        # Keep track of which player we are
-        self.ID = inputPlayerId
-        if inputPlayerId == PLAYER_ONE:
-            self.enemyID = PLAYER_TWO
-        else:
-            self.enemyID = PLAYER_ONE
-
-        # Our list of consolidated state objects
-        self.consolidatedState = []
-
-        ##
-        # File I/O code. This searches the parent directory to find a pickle file which we will use to
-        # import the states and their utilities
-        #   NOTE: You may have to change the chdir call to a more specific file path if it doesn't work
-        ##
-        os.chdir('..')
-        path = os.getcwd()
-        for file in os.listdir(path):
-            if file.endswith(".p"):
-                self.readFile()
-        # Setting the discount factor variable
-        self.discountFact = 0.99
-        # Setting the learning rate variable
-        self.learningRate = 0.1
-        # Creating the list of utilities to use when picking an action
-        self.Utilities = []
-
-    ##
-    # getPlacement
-    #
-    # Description: The getPlacement method corresponds to the
-    # action taken on setup phase 1 and setup phase 2 of the game.
-    # In setup phase 1, the AI player will be passed a copy of the
-    # state as currentState which contains the board, accessed via
-    # currentState.board. The player will then return a list of 11 tuple
-    # coordinates (from their side of the board) that represent Locations
-    # to place the anthill and 9 grass pieces. In setup phase 2, the player
-    # will again be passed the state and needs to return a list of 2 tuple
-    # coordinates (on their opponent's side of the board) which represent
-    # Locations to place the food sources. This is all that is necessary to
-    # complete the setup phases.
-    #
-    # Parameters:
-    #   currentState - The current state of the game at the time the Game is
-    #       requesting a placement from the player.(GameState)
-    #
-    # Return: If setup phase 1: list of eleven 2-tuples of ints -> [(x1,y1), (x2,y2),?,(x10,y10)]
-    #       If setup phase 2: list of two 2-tuples of ints -> [(x1,y1), (x2,y2)]
-    ##
-    def getPlacement(self, currentState):
-        if currentState.phase == SETUP_PHASE_1:
-
-            # We will setup our base to give food gatherers max freedom
-            return [(0, 0), (5, 2),
-                    (0, 3), (1, 3), (2, 3), (3, 3),
-                    (4, 3), (5, 3), (6, 3),
-                    (7, 3), (8, 3)]
-
-        ##
-        # Phase Two of setup... we will try to place the food as far away
-        # from the enemy anthill/tunnel as possible
-        elif currentState.phase == SETUP_PHASE_2:
-
-            enemyConsts = getConstrList(currentState, self.enemyID, (ANTHILL, TUNNEL))
-            enemyConstCords = [enemyConsts[0].coords, enemyConsts[1].coords]
-            foodCoords = [enemyConsts[0].coords, enemyConsts[1].coords]
-            dists = [0, 0]
-
-            for x in range(0, 10):
-                for y in range(6, 10):
-                    if getConstrAt(currentState, (x, y)) == None:
-                        # find the distance from this cell to the enemy tunnel
-                        newDists = (stepsToReach(currentState, enemyConstCords[0], (x, y)),
-                                    stepsToReach(currentState, enemyConstCords[1], (x, y)))
-
-                        # If this is farther away, save it
-                        if newDists[0] > dists[0]:
-                            foodCoords[0] = (x, y)
-                            dists[0] = newDists[0]
-                            continue
-                        if newDists[1] > dists[1]:
-                            foodCoords[1] = (x, y)
-                            dists[1] = newDists[1]
-
-            return foodCoords
-
-        # This should never happen
-        return None
-
-    ##
-    # getMove
-    # Description: The getMove method corresponds to the play phase of the game
-    # and requests from the player a Move object. All types are symbolic
-    # constants which can be referred to in Constants.py. The move object has a
-    # field for type (moveType) as well as field for relevant coordinate
-    # information (coordList). If for instance the player wishes to move an ant,
-    # they simply return a Move object where the type field is the MOVE_ANT constant
-    # and the coordList contains a listing of valid locations starting with an Ant
-    # and containing only unoccupied spaces thereafter. A build is similar to a move
-    # except the type is set as BUILD, a buildType is given, and a single coordinate
-    # is in the list representing the build location. For an end turn, no coordinates
-    # are necessary, just set the type as END and return.
-    #
-    # Parameters:
-    #   currentState - The current state of the game at the time the Game is
-    #       requesting a move from the player.(GameState)
-    #
-    # Return: Move(moveType [int], coordList [list of 2-tuples of ints], buildType [int]
-    ##
-    def getMove(self, currentState):
-        # Creating a list of actions
-        actions = []
-        # Adding all of the possible moves to the actions list
-        actions = listAllLegalMoves(currentState)
-        # Creating a list of the next states we can be in
-        nextStates = []
-        # Removing the build moves from the actions list as we don't want to build any anys
-        for i in actions:
-            if type(i) == BUILD:
-                actions.remove(i)
-        # Getting the next states based on the actions we can take
-        for i in actions:
-            nextStates.append(getNextState(currentState, i))
-        # Creating a list to put the consolidated states in
-        nextConsolidatedStates = []
-        # Adding the consolidated states to the list
-        for i in nextStates:
-            nextConsolidatedStates.append(self.consolidatState(i))
-        # Creating a list of utilities
-        utilityList = []
-        # Getting the utilities of the states we can enter based on the utilities we have learned
-        for i in range(0, len(nextConsolidatedStates)):
-            for j in self.consolidatedState:
-                if dir(j) == dir(nextConsolidatedStates[i]):
-                    utilityList.append(j.Utility)
-                else:
-                    utilityList.append(-10)
-        # Setting the max utility we've seen already to a very low number
-        maxUtil = -100000
-        maxIndex = 0
-        # Search through the possible states and pick the one that has the highest utility and get its index in the list
-        for i in range(0, len(utilityList)):
-            if utilityList[i] > maxUtil:
-                maxUtil = utilityList[i]
-                maxIndex = i
-        # Choose the action that will lead us to the state with the highest utility
-        return actions[maxIndex]
-
-
-
-    ##
-    # getAttack
-    # Description: The getAttack method is called on the player whenever an ant completes
-    # a move and has a valid attack. It is assumed that an attack will always be made
-    # because there is no strategic advantage from withholding an attack. The AIPlayer
-    # is passed a copy of the state which again contains the board and also a clone of
-    # the attacking ant. The player is also passed a list of coordinate tuples which
-    # represent valid locations for attack. Hint: a random AI can simply return one of
-    # these coordinates for a valid attack.
-    #
-    # Parameters:
-    #   currentState - The current state of the game at the time the Game is requesting
-    #       a move from the player. (GameState)
-    #   attackingAnt - A clone of the ant currently making the attack. (Ant)
-    #   enemyLocation - A list of coordinate locations for valid attacks (i.e.
-    #       enemies within range) ([list of 2-tuples of ints])
-    #
-    # Return: A coordinate that matches one of the entries of enemyLocations. ((int,int))
-    ##
-    def getAttack(self, currentState, attackingAnt, enemyLocations):
-        # Employ ancient roman battle techniques to defeat the enemy
-        return enemyLocations[0]
-
-    ##
-    # registerWin
-    # Description: The last method, registerWin, is called when the game ends and simply
-    # indicates to the AI whether it has won or lost the game. This is to help with
-    # learning algorithms to develop more successful strategies.
-    #
-    # Parameters:
-    #   hasWon - True if the player has won the game, False if the player lost. (Boolean)
-    #
-    def registerWin(self, hasWon):
-        # method templaste, not implemented
-        # Each time your agent completes a game, save your current state utilities to a file.
-
-        # This was used to write to the pickle file after every game
-        #self.writeFile()
-        pass
-
-    ##
-    # makePath
-    #
-    # Description: makePath is a modified version of createPathTowards in the AIPlayerUtils file. it will
-    #              create a path towards whatever your destination is, while also returning any ants that
-    #              are owned by the AI and are in the path. This is useful for moving ants out of the way
-    #              of other ants.
-    # Parameters:
-    #   currentState - The current state object for the game
-    #   sourceCoords - The coordinates to start the path at
-    #   targetCoords - The coordinates we are trying to get to
-    #   movement - The movement value for that particular ant
-    #
-    def makePath(self, currentState, sourceCoords, targetCoords, movement):
-        distToTarget = approxDist(sourceCoords, targetCoords)
-        path = [sourceCoords]
-        curr = sourceCoords
-        antsInPath = []
-
-        # keep adding steps to the path until movement runs out
-        while (movement > 0):
-
-            found = False  # was a new step found to add to the path
-            for coord in listAdjacent(sourceCoords):
-                # is this a step headed in the right direction?
-                if (approxDist(coord, targetCoords) < distToTarget):
-
-                    # how much movement does it cost to get there?
-                    constr = getConstrAt(currentState, coord)
-                    moveCost = 1  # default cost
-                    if (constr != None):
-                        moveCost = CONSTR_STATS[constr.type][MOVE_COST]
-
-                    # if I have enough movement left then add it to the path
-                    if (moveCost <= movement):
-                        # add the step to the path
-                        found = True
-                        path.append(coord)
-
-                        # See if there's an ant there, if so, add it to our ant in path list
-                        ant = getAntAt(currentState, coord)
-                        if ant != None:
-                            if ant.player == PLAYER_TWO:
-                                antsInPath.append(ant)
-                            else:
-                                # If it is not our ant, then this is as far as we can go
-                                return [path, antsInPath]
-
-                        # restart the search from the new coordinate
-                        movement = movement - moveCost
-                        sourceCoords = coord
-                        break
-            if (not found):
-                break  # no usable steps found
-
-        return [path, antsInPath]
-
-    ##
-    # moveAntInPath
-    #
-    # Description: Generates a move object for any ant that is in the path of the given ant. The direction
-    #              the ant moves is rather arbitrary, it's only goal is to move out of the path, whatever
-    #              that means.
-    # Parameters:
-    #   currentState - The current state of the game
-    #   ant - The ant object we want to move
-    #   antDest - Where the ant is trying to go
-    #   antType - The type of the ant, used to find out movement
-    ##
-    def moveAntInPath(self, currentState, ant, antDest, antType):
-        pathWithAnts = self.makePath(currentState, ant.coords, antDest, UNIT_STATS[antType][MOVEMENT])
-        path = pathWithAnts[0]
-        antsInPath = pathWithAnts[1]
-
-        # If there are ants in the way and they haven't been moved, try to move them
-        for antInPath in antsInPath:
-            if not antInPath.hasMoved:
-                for cell in listReachableAdjacent(currentState, antInPath.coords,
-                                                  UNIT_STATS[antInPath.type][MOVEMENT]):
-                    if cell not in path and getConstrAt(currentState, cell) is None:
-                        path = createPathToward(currentState, antInPath.coords, cell,
-                                                UNIT_STATS[antInPath.type][MOVEMENT])
-                        return Move(MOVE_ANT, path, None)
-
-        # No ant can be moved
-        return None
-
-    ##
-    #   findPathCost
-    #
-    #   Description: Calculates how many steps it would take to complete a path
-    #
-    #   Parameters:
-    #       path - The path in question, follows the format [(srcX, srcY), ..., (dstX, dstY)]
-    ##
-    def findPathCost(self, currentState, path):
-        # If our path isn't long enough or it is a cycle then cost is 0
-        if len(path) < 3 or path[0] == path[len(path) - 1]:
-            return 0
-
-        # Path starts at 0 cost
-        pathCost = 0
-        for cell in path:
-
-            # Get the cell cost, add it to our running total
-            cellCost = 1  # default
-            constAtCell = getConstrAt(currentState, cell)
-            if constAtCell is not None:
-                cellCost = CONSTR_STATS[constAtCell.type][MOVE_COST]
-
-            pathCost += cellCost
-
-        return pathCost
-
-    ###
-    # writeFile
-    #
-    # Description: Takes the objects from our consolidated states and writes them to a pickle file
-    #
-    # Parameters:
-    #   self - the object that has called this function
-    ###
-    def writeFile(self):
-        # Opening the file
-        f = open('santilla18_kister19.p', 'wb')
-        # Writing the list of objects to the output file
-        pickle.dump(self.consolidatedState,f)
-        # Closing the file
-        f.close()
-
-    ###
-    # readFile
-    #
-    # Description: Takes the objects from a pickle file and stores them into our consolidated states list
-    #
-    # Parameters:
-    #   self - the object that has called this function
-    #
-    ###
-    def readFile(self):
-        # Opening the file
-        f = open('santilla18_kister19.p', 'rb')
-        # Retrieving the data from the file and putting it into our consolidated states list
-        self.consolidatedState = pickle.load(f)
-        # Printing the states to the terminal for the user to see them
-        print self.consolidatedState
-        # Closing the file
-        f.close()
-    ##
-    # hasWon(int)
-    # Description: Determines whether the game has ended in victory for the given player.
-    #
-    # Parameters:
-    #   playerId - The ID of the player being checked for winning (int)
-    #   currentState - The current state of the game
-    #
-    # Returns: True if the player with playerId has won the game.
-    ##
-    def hasWon(self, currentState, playerId):
-        opponentId = (playerId + 1) % 2
-
-        if ((currentState.phase == PLAY_PHASE) and
-            ((currentState.inventories[opponentId].getQueen() == None) or
-                    (currentState.inventories[opponentId].getAnthill().captureHealth <= 0) or
-                    (currentState.inventories[playerId].foodCount >= FOOD_GOAL) or
-                    (currentState.inventories[opponentId].foodCount == 0 and
-                    len(currentState.inventories[opponentId].ants) == 1))):
-            return True
-
-        else:
-            return False
-
-    ##
-    # reward(float)
-    # Description: Takes in a state and generates the reward for that given state.
-    #
-    # Parameters:
-    #   currentState - The current state of the game
-    #
-    # Returns: The reward for the given state
-    ##
-    def reward(self, currentState):
-        # If we have won, return a 1
-        if self.hasWon(currentState, self.playerId):
-            return 1
-        # If we have lost, return a 0
-        elif self.hasWon(currentState, (self.playerId+1)%2):
-            return 0
-        # If we haven't won or lost, return -0.01
-        else:
-            return -0.01
-
-    ##
-    # consolidatState
-    # Description: Takes a game state and returns a consolidated version of it.
-    #
-    # Parameters:
-    #   currentState - The current state of the game
-    ##
-    def consolidatState(self, currentState):
-        # Getting if we have won/lost
-        aiWon = self.hasWon(currentState,self.playerId)
-        enemyWon = self.hasWon(currentState, (self.playerId+1)%2)
-        # Creating a consolidated version of the current state
-        newState = Consolidation(currentState, aiWon, enemyWon)
-        # Appending this state to our list of consolidated states
-        self.consolidatedState.append(newState)
-
-    ##
-    # tdLearning
-    # Description: Performs the TD Learning algorithm on the set of consolidated states we have
-    #
-    # Parameters:
-    #   cs - The current state of the game
-    #   nextState - The next state of the game we are going to be in
-    ##
-    def tdLearning(self,cs,nextState):
-        # Creating a consolidated object out of the next state
-        obj = Consolidation(nextState,self.hasWon(cs,self.playerId),self.hasWon(cs, (self.playerId+1)%2))
-        # Getting the utility
-        utility = obj.Utility
-        # Searching through the list of states to see if we already have a utility for this state. If so use that utility
-        for i in self.consolidatedState:
-            if dir(obj) == dir(i):
-                utility = i.Utility
-        # Updating all of the previous states based on the TD Learning algorithm
-        for i in self.consolidatedState:
-            i.Utility = i.Utility + self.learningRate*(self.reward(cs)+self.discountFact*((utility)-i.Utility))
-
-
-##
-# Consolidation
-# Description: This class contains some elements of an Antics state. It contains what we have
-# deemed the most important parts of the state to use to generate an utility
-#
-#
-# Variables:
-#   currentState - The current state to be consolidated
-#   iWon - A boolean variable telling us if we have won
-#   iLost - A boolean variable telling us if we have lost
-##
-class Consolidation(Player):
-    # __init__
-    # Description: Creates a new Player
-    #
-    # Parameters:
-    #   inputPlayerId - The id to give the new player (int)
-    ##
-    def __init__(self, currentState, iWon, iLost):
-        # If I have won this is a good utility, so set it to be a large number
-        if iWon:
-            self.Utility = 1000
-        # If I have lost this is a bad utility, so set it to be a large negative number
-        elif iLost:
-            self.Utility = -1000
-        # Otherwise set my utility to a random number
-        else:
-            self.Utility = random.randint(0,100)
-
-        ##
-        # The following code gathers information about the state to use to create the variables for the class
-        ##
-        self.myTunnel = None
-
-        if (self.myTunnel == None):
-            self.myTunnel = getConstrList(currentState, currentState.whoseTurn, (TUNNEL,))[0]
-
-        for inv in currentState.inventories:
-            if inv.player == currentState.whoseTurn:
-                inventory = inv
-            else:
-                enemyInv = inv
-
-        antHill = inventory.getAnthill()
-
-        # Distinguish our ants
-        workers = []
-        drones = []
-        soldiers = []
-        rangers = []
-        queen = []
-        for ant in inventory.ants:
-            antType = ant.type
-            workers.append(ant) if antType == WORKER else 0
-            drones.append(ant) if antType == DRONE else 0
-            soldiers.append(ant) if antType == SOLDIER else 0
-            rangers.append(ant) if antType == R_SOLDIER else 0
-            queen.append(ant) if antType == QUEEN else 0
-
-        # Distinguish enemy ants
-        enemyworkers = []
-        enemydrones = []
-        enemysoldiers = []
-        enemyrangers = []
-        enemyqueen = []
-        for ant in enemyInv.ants:
-            antType = ant.type
-            enemyworkers.append(ant) if antType == WORKER else 0
-            enemydrones.append(ant) if antType == DRONE else 0
-            enemysoldiers.append(ant) if antType == SOLDIER else 0
-            enemyrangers.append(ant) if antType == R_SOLDIER else 0
-            enemyqueen.append(ant) if antType == QUEEN else 0
-
-        # Obtain our food list and prune the food list
-        # to only contain our food
-        foodList = getConstrList(currentState, None, (FOOD,))
-        enemyFood = []
-        for food in foodList:
-            if food.coords[1] > 3:
-                enemyFood.append(food)
-
-        for food in enemyFood:
-            foodList.remove(food)
-
-        # Prune ant list to contain only our ants
-        antsToRemove = []
-        for ant in workers:
-            if ant.player != currentState.whoseTurn:
-                antsToRemove.append(ant)
-
-        for ant in antsToRemove:
-            workers.remove(ant)
-
-
-        ##
-        # Setting the class variables using the information from the state gathered above
-        #
-        self.myNumFood = inventory.foodCount
-        self.enemyNumFood = enemyInv.foodCount
-        self.myNonWorkers = len(workers)
-        self.enemyNonWorkers = len(enemyworkers)
-        self.distToTunnel = []
-        self.enemyDistToQueen = []
-
-        ##
-        # Getting the information to add to the distance to tunnel and distance to queen lists
-        ##
-        tunnelCoords = self.myTunnel.coords
-        for ant in inventory.ants:
-            antCoords = ant.coords
-            valuex = abs(tunnelCoords[0] - antCoords[0])
-            valuey = abs(tunnelCoords[1] - antCoords[1])
-            value = sqrt(abs(valuex - valuey))
-            self.distToTunnel.append(value)
-
-        queenCoords = inventory.getQueen().coords
-        for ant in enemysoldiers:
-            enemyCoords = ant.coords
-            valuex = abs(enemyCoords[0] - antCoords[0])
-            valuey = abs(enemyCoords[1] - antCoords[1])
-            value = sqrt(abs(valuex - valuey))
-            self.enemyDistToQueen.append(value)
+# -*- coding: latin-1 -*-
+from __future__ import print_function
+import random
+import sys
+import os
+import time
+import multiprocessing
+from collections import OrderedDict
+import pickle
+import struct
+import hashlib
+import zlib
+import heapq
+import itertools
+import threading
+import atexit
+import signal
+import json
+import csv
+import tempfile
+import shutil
+import platform
+from timeit import default_timer
+
+sys.path.append("..")  # so other modules can be found in parent dir
+from Player import *
+from Constants import *
+from Construction import Construction, CONSTR_STATS
+from Ant import Ant, UNIT_STATS
+from Move import Move
+from math import sqrt
+from GameState import GameState, addCoords
+from AIPlayerUtils import *
+from pprint import pprint
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    from multiprocessing import shared_memory
+    from multiprocessing import resource_tracker
+except ImportError:
+    # Python 3.8 and later only, the training harness just can't share its table in memory
+    shared_memory = None
+
+try:
+    import numpy as np
+except ImportError:
+    # The agent still plays without numpy, it just scores candidate states one at a time
+    np = None
+
+
+##
+# AIPlayer
+# Description: The responsbility of this class is to interact with the game by
+# deciding a valid move based on a given game state. This class has methods that
+# will be implemented by students in Dr. Nuxoll's AI course.
+#
+# Variables:
+#   playerId - The id of the player.
+##
+class AIPlayer(Player):
+    # __init__
+    # Description: Creates a new Player
+    #
+    # Parameters:
+    #   inputPlayerId - The id to give the new player (int)
+    #   dataDir - The directory our learned files are kept in, by default the one given by
+    #             DATA_DIR_ENV or else the directory above this file's (the Antics directory)
+    ##
+    def __init__(self, inputPlayerId, dataDir=None):
+        super(AIPlayer, self).__init__(inputPlayerId, "HW 6 Agent")
+
+        # Tweaking these should definitely alter the success of the AI
+        self.NUM_DESIRED_DRONES = 1
+        self.NUM_DESIRED_WORKERS = 2
+        self.MIN_DESIRED_FOOD = 2
+
+        # We would like to know where our tunnel is
+        self.myTunnel = None
+        # Step costs and occupancy of the board in the current game, built once setup is done
+        self.board = None
+
+        # Keep track of which player we are
+        self.ID = inputPlayerId
+        if inputPlayerId == PLAYER_ONE:
+            self.enemyID = PLAYER_TWO
+        else:
+            self.enemyID = PLAYER_ONE
+
+        # Our table of consolidated state utilities, keyed by Consolidation.getKey()
+        self.consolidatedState = UtilityTable()
+        # The most states the table keeps in memory (None for no limit) and which it forgets first
+        self.tableCapacity = None
+        self.evictionPolicy = EVICT_LEAST_RECENT
+        # Which value function we pick moves and learn with, TABLE_BACKEND or LINEAR_BACKEND
+        self.valueBackend = TABLE_BACKEND
+        # The weights of the linear value function (only available with numpy)
+        self.linearModel = LinearValueModel() if np is not None else None
+        # The legal moves and successors of positions we have already expanded
+        self.transpositions = TranspositionCache(10000)
+        # Per turn timings, switched on by setting PROFILE_ENV to the directory to write them to
+        self.profiler = Profiler.fromEnvironment(inputPlayerId)
+        # Past transitions to learn from again between games. Off unless a ReplayBuffer is set
+        self.replay = None
+        # How many minibatches are replayed after each game, and how big they are
+        self.replayBatches = 8
+        self.replayBatchSize = 64
+        # Whether minibatches favour transitions with large TD errors
+        self.prioritizedReplay = True
+        # How many ant moves we look ahead at each turn, or None to look at them all
+        self.candidateLimit = 16
+        # A frozen agent only plays: it never changes its table or weights, writes no files and
+        # logs nothing, so a learned table can be evaluated as it is
+        self.frozen = False
+        # Successors are generated on this many worker processes when there are at least
+        # parallelThreshold of them to generate. 0 keeps everything in this process
+        self.parallelWorkers = 0
+        self.parallelThreshold = 32
+        # The worker processes, started during setup (see startPool), and the results they were
+        # still working on when a move's deadline passed
+        self.pool = None
+        self.abandoned = []
+        # The most seconds getMove spends generating successors before it settles for the best move
+        # it has found so far, or None for no limit
+        self.moveDeadline = None
+        # Whether our TD steps run on a background thread (see AsyncLearner) instead of in our turn.
+        # The learner is started the first time it is needed
+        self.asyncLearning = False
+        self.learner = None
+        # Writes every turn we play to disk, switched on by setting EPISODE_LOG_ENV to a directory
+        self.episodeLog = EpisodeLogger.fromEnvironment(inputPlayerId)
+
+        ##
+        # File I/O code. Our learned utilities are not read here, so the engine can create us quickly.
+        # They are loaded once, in the background during setup or else at our first move (see loadTable)
+        ##
+        self.dataDir = os.path.abspath(dataDir or defaultDataDir())
+        # Whether the table has been read in from our files yet
+        self.loaded = False
+        # Makes sure the table is only read once when it is loaded in the background
+        self.loadLock = threading.Lock()
+        # Whether to start loading the table on a background thread during setup
+        self.backgroundLoad = True
+        # Setting the discount factor variable
+        self.discountFact = 0.99
+        # Setting the learning rate variable
+        self.learningRate = 0.1
+        # Setting the eligibility trace decay (lambda) variable
+        self.traceDecay = 0.9
+        # Traces that decay below this are dropped, so we stop updating states we visited long ago
+        self.traceCutoff = 0.01
+        # The eligibility trace of each state key we have visited this game
+        self.traces = {}
+        # The utility log is compacted into the utility file once it grows past this fraction of it
+        self.compactFraction = COMPACT_LOG_FRACTION
+        # Creating the list of utilities to use when picking an action
+        self.Utilities = []
+
+    ##
+    # getPlacement
+    #
+    # Description: The getPlacement method corresponds to the
+    # action taken on setup phase 1 and setup phase 2 of the game.
+    # In setup phase 1, the AI player will be passed a copy of the
+    # state as currentState which contains the board, accessed via
+    # currentState.board. The player will then return a list of 11 tuple
+    # coordinates (from their side of the board) that represent Locations
+    # to place the anthill and 9 grass pieces. In setup phase 2, the player
+    # will again be passed the state and needs to return a list of 2 tuple
+    # coordinates (on their opponent's side of the board) which represent
+    # Locations to place the food sources. This is all that is necessary to
+    # complete the setup phases.
+    #
+    # Parameters:
+    #   currentState - The current state of the game at the time the Game is
+    #       requesting a placement from the player.(GameState)
+    #
+    # Return: If setup phase 1: list of eleven 2-tuples of ints -> [(x1,y1), (x2,y2),?,(x10,y10)]
+    #       If setup phase 2: list of two 2-tuples of ints -> [(x1,y1), (x2,y2)]
+    ##
+    def getPlacement(self, currentState):
+        if currentState.phase == SETUP_PHASE_1:
+            # A new game is starting on a new board
+            self.board = None
+            self.startPool()
+            # Read in our table while the setup phases play out, so it is ready for our first move
+            if self.backgroundLoad and not self.loaded:
+                loader = threading.Thread(target=self.loadTable)
+                loader.daemon = True
+                loader.start()
+
+            # We will setup our base to give food gatherers max freedom
+            return [(0, 0), (5, 2),
+                    (0, 3), (1, 3), (2, 3), (3, 3),
+                    (4, 3), (5, 3), (6, 3),
+                    (7, 3), (8, 3)]
+
+        ##
+        # Phase Two of setup... we will try to place the food as far away
+        # from the enemy anthill/tunnel as possible
+        elif currentState.phase == SETUP_PHASE_2:
+
+            board = self.getBoard(currentState)
+            enemyConsts = getConstrList(currentState, self.enemyID, (ANTHILL, TUNNEL))
+            enemyConstCords = [enemyConsts[0].coords, enemyConsts[1].coords]
+            foodCoords = [enemyConsts[0].coords, enemyConsts[1].coords]
+            dists = [0, 0]
+
+            for x in range(0, 10):
+                for y in range(6, 10):
+                    if board.constrAt((x, y)) == None:
+                        # find the distance from this cell to the enemy tunnel
+                        newDists = (board.stepCost(enemyConstCords[0], (x, y)),
+                                    board.stepCost(enemyConstCords[1], (x, y)))
+
+                        # If this is farther away, save it
+                        if newDists[0] > dists[0]:
+                            foodCoords[0] = (x, y)
+                            dists[0] = newDists[0]
+                            continue
+                        if newDists[1] > dists[1]:
+                            foodCoords[1] = (x, y)
+                            dists[1] = newDists[1]
+
+            return foodCoords
+
+        # This should never happen
+        return None
+
+    ##
+    # getMove
+    # Description: The getMove method corresponds to the play phase of the game
+    # and requests from the player a Move object. All types are symbolic
+    # constants which can be referred to in Constants.py. The move object has a
+    # field for type (moveType) as well as field for relevant coordinate
+    # information (coordList). If for instance the player wishes to move an ant,
+    # they simply return a Move object where the type field is the MOVE_ANT constant
+    # and the coordList contains a listing of valid locations starting with an Ant
+    # and containing only unoccupied spaces thereafter. A build is similar to a move
+    # except the type is set as BUILD, a buildType is given, and a single coordinate
+    # is in the list representing the build location. For an end turn, no coordinates
+    # are necessary, just set the type as END and return.
+    #
+    # Parameters:
+    #   currentState - The current state of the game at the time the Game is
+    #       requesting a move from the player.(GameState)
+    #
+    # Return: Move(moveType [int], coordList [list of 2-tuples of ints], buildType [int]
+    ##
+    def getMove(self, currentState):
+        if not self.loaded:
+            self.loadTable()
+        # Normally started during setup, but games started without one still get their workers
+        # before the clock starts
+        self.startPool()
+        profiler = self.profiler
+        started = profiler.startTurn()
+        deadline = None if self.moveDeadline is None else default_timer() + self.moveDeadline
+        if self.asyncLearning and self.learner is None and not self.frozen:
+            self.learner = AsyncLearner(self)
+        signature = stateSignature(currentState)
+        # Adding all of the possible moves to the actions list
+        actions = self.legalMoves(currentState, signature)
+        lap = profiler.lap('legalMoves', started)
+        # Narrowing them down to the few worth looking ahead at
+        actions = self.candidateMoves(currentState, actions)
+        profiler.lap('candidates', lap)
+        # Getting the next states based on the actions we can take (only the ones we got to in time)
+        actions, keys, features, outcomes = self.successors(currentState, signature, actions, deadline)
+        # Score every state we can enter in one pass and choose the action that leads to the best one
+        lap = profiler.start()
+        utilities = self.scoreStates(keys, features, outcomes)
+        profiler.lap('lookup', lap)
+        if np is not None:
+            best = int(np.argmax(utilities))
+        else:
+            best = utilities.index(max(utilities))
+        move = actions[best]
+        if self.learner is not None:
+            self.learner.add(currentState, keys[best], features[best], outcomes[best])
+        if self.episodeLog is not None and not self.frozen:
+            self.episodeLog.record(keys[best], features[best], move, self.outcomeReward(*outcomes[best]),
+                                   utilities[best])
+        profiler.endTurn(started)
+        return move
+
+    ##
+    # candidateMoves
+    # Description: Picks the moves worth generating and scoring the successor of. Build moves are
+    # dropped as we don't want to build any ants. Moves of an ant that end on the same square lead
+    # to the same state, so only the shortest is kept. If that still leaves more than
+    # candidateLimit ant moves, they are ranked by how much closer they bring the ant to where it
+    # wants to be (see moveGain) and only the best are kept. Ending the turn is always a candidate.
+    #
+    # Parameters:
+    #   currentState - The state the moves are made in
+    #   actions - The legal moves in currentState
+    #
+    # Returns: The candidate moves
+    ##
+    def candidateMoves(self, currentState, actions):
+        ends = []
+        paths = OrderedDict()
+        for move in actions:
+            if move.moveType == BUILD:
+                continue
+            if move.moveType != MOVE_ANT:
+                ends.append(move)
+                continue
+            route = (move.coordList[0], move.coordList[-1])
+            shortest = paths.get(route)
+            if shortest is None or len(move.coordList) < len(shortest.coordList):
+                paths[route] = move
+
+        moves = list(paths.values())
+        if self.candidateLimit is None or len(moves) <= self.candidateLimit:
+            return ends + moves
+
+        inventory = currentState.inventories[currentState.whoseTurn]
+        enemyInv = currentState.inventories[1 - currentState.whoseTurn]
+        ants = dict((ant.coords, ant) for ant in inventory.ants)
+        homes = [constr.coords for constr in inventory.constrs if constr.type in (ANTHILL, TUNNEL)]
+        foods = [constr.coords for constr in getConstrList(currentState, None, (FOOD,))]
+        enemies = [ant.coords for ant in enemyInv.ants]
+        gains = dict((route, moveGain(ants.get(route[0]), route[0], route[1], homes, foods, enemies))
+                     for route in paths)
+        ranked = sorted(paths, key=lambda route: -gains[route])
+        return ends + [paths[route] for route in ranked[:self.candidateLimit]]
+
+    ##
+    # legalMoves
+    # Description: Lists the legal moves in a state, remembering them in our transposition cache
+    #
+    # Parameters:
+    #   currentState - The state to list the moves of
+    #   signature - The stateSignature of currentState
+    #
+    # Returns: A new list of the legal moves
+    ##
+    def legalMoves(self, currentState, signature):
+        moves = self.transpositions.get((signature,))
+        if moves is None:
+            moves = listAllLegalMoves(currentState)
+            self.transpositions.put((signature,), moves)
+        return list(moves)
+
+    ##
+    # successors
+    # Description: Finds the key, features and outcome of the state each of a list of moves leads
+    # to. Successors are remembered in our transposition cache. The ones that aren't there yet are
+    # described in batches, on our worker processes if there are enough of them (see
+    # parallelWorkers). If the deadline passes, the moves not described by then are left out;
+    # at least one move is always described. Unless that happens the results don't depend on how
+    # the work was split up.
+    #
+    # Parameters:
+    #   currentState - The state the moves are made in
+    #   signature - The stateSignature of currentState
+    #   actions - The moves to make
+    #   deadline - The default_timer time to stop generating successors at, or None
+    #
+    # Returns: [actions, keys, features, outcomes] where actions are the moves that were described
+    #          and the rest are as used by scoreStates
+    ##
+    def successors(self, currentState, signature, actions, deadline=None):
+        entries = []
+        missing = []
+        for i in range(0, len(actions)):
+            entry = self.transpositions.get((signature, moveSignature(actions[i])))
+            if entry is None:
+                missing.append(i)
+            entries.append(entry)
+
+        if self.parallelWorkers and len(missing) >= self.parallelThreshold:
+            self.expandParallel(currentState, signature, actions, missing, entries, deadline)
+            missing = [i for i in missing if entries[i] is None]
+        # Whatever the workers didn't describe is described here in the time that is left
+        if missing:
+            self.expandSerial(currentState, signature, actions, missing, entries, deadline)
+
+        found = [i for i in range(0, len(entries)) if entries[i] is not None]
+        rows = [entries[i][1] for i in found]
+        features = np.array(rows, dtype=float) if np is not None else rows
+        return ([actions[i] for i in found], [entries[i][0] for i in found], features,
+                [entries[i][2] for i in found])
+
+    ##
+    # expandSerial
+    # Description: Generates and describes successors in this process. Without a deadline they are
+    # described in one batch. With one they are described a move at a time at first, then in
+    # batches of as many moves as the time left looks to allow (at most SERIAL_CHUNK_MOVES), so
+    # the deadline is overshot by one move at most. Once time is up it stops, as long as some move
+    # has been described.
+    #
+    # Parameters:
+    #   currentState - The state the moves are made in
+    #   signature - The stateSignature of currentState
+    #   actions - The moves
+    #   indices - Which of the moves to describe
+    #   entries - The transposition entry of each move, filled in as they are described
+    #   deadline - The default_timer time to stop at, or None
+    ##
+    def expandSerial(self, currentState, signature, actions, indices, entries, deadline):
+        step = len(indices) if deadline is None else 1
+        moveTime = 0.0
+        start = 0
+        while start < len(indices):
+            if deadline is not None:
+                left = deadline - default_timer()
+                if left < moveTime and any(entries):
+                    return
+                if moveTime > 0:
+                    step = max(1, min(SERIAL_CHUNK_MOVES, int(left / moveTime)))
+            chunk = indices[start:start + step]
+            started = default_timer()
+            lap = self.profiler.start()
+            nextStates = [getNextState(currentState, actions[i]) for i in chunk]
+            lap = self.profiler.lap('getNextState', lap)
+            keys, features, outcomes = self.describeStates(nextStates)
+            self.profiler.lap('consolidation', lap)
+            self.storeSuccessors(signature, actions, chunk, keys, features, outcomes, entries)
+            moveTime = (default_timer() - started) / len(chunk)
+            start += len(chunk)
+
+    ##
+    # expandParallel
+    # Description: Generates and describes successors on our worker processes (see expandMoves).
+    # The moves are split into a few chunks per worker, and the chunks are collected in order.
+    # Once the deadline has passed only chunks that are already done are collected. Chunks left
+    # behind can't be cancelled, so while any of them are still running the workers are busy and
+    # nothing is sent to them (the moves are left to expandSerial).
+    #
+    # Parameters:
+    #   The same as expandSerial
+    ##
+    def expandParallel(self, currentState, signature, actions, indices, entries, deadline):
+        self.abandoned = [result for result in self.abandoned if not result.ready()]
+        if self.abandoned:
+            return
+        self.startPool()
+        size = -(-len(indices) // (self.parallelWorkers * PARALLEL_CHUNKS_PER_WORKER))
+        chunks = [indices[start:start + size] for start in range(0, len(indices), size)]
+        lap = self.profiler.start()
+        results = [self.pool.apply_async(expandMoves,
+                                          ((currentState, [actions[i] for i in chunk], self.playerId),))
+                   for chunk in chunks]
+        for chunk, result in zip(chunks, results):
+            timeout = None if deadline is None else max(deadline - default_timer(), 0)
+            try:
+                keys, features, outcomes = result.get(timeout)
+            except multiprocessing.TimeoutError:
+                self.abandoned.append(result)
+                continue
+            self.storeSuccessors(signature, actions, chunk, keys, features, outcomes, entries)
+        self.profiler.lap('parallelExpand', lap)
+
+    ##
+    # startPool
+    # Description: Starts our worker processes if we use them and they aren't running yet. This is
+    # done during setup so starting them doesn't eat into a move's deadline, and they are stopped
+    # when we exit.
+    ##
+    def startPool(self):
+        if self.parallelWorkers and self.pool is None:
+            self.pool = multiprocessing.Pool(self.parallelWorkers)
+            atexit.register(self.stopPool)
+
+    ##
+    # stopPool
+    # Description: Stops our worker processes, dropping whatever they are still working on
+    ##
+    def stopPool(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+            self.abandoned = []
+
+    ##
+    # storeSuccessors
+    # Description: Remembers described successors in our transposition cache
+    #
+    # Parameters:
+    #   signature - The stateSignature of the state the moves are made in
+    #   actions - The moves
+    #   indices - Which of the moves were described
+    #   keys, features, outcomes - Their descriptions (see stateFeatureMatrix)
+    #   entries - The transposition entry of each move
+    ##
+    def storeSuccessors(self, signature, actions, indices, keys, features, outcomes, entries):
+        for j in range(0, len(indices)):
+            entry = (keys[j], features[j], outcomes[j])
+            self.transpositions.put((signature, moveSignature(actions[indices[j]])), entry)
+            entries[indices[j]] = entry
+
+    ##
+    # evaluateStates
+    # Description: Scores a whole list of candidate states at once. The states are turned into a
+    # feature matrix (see stateFeatureMatrix) and scored by scoreStates.
+    #
+    # Parameters:
+    #   states - The list of states to score
+    #
+    # Returns: The utility of each state, as a numpy array if numpy is available, otherwise a list
+    ##
+    def evaluateStates(self, states):
+        keys, features, outcomes = self.describeStates(states)
+        return self.scoreStates(keys, features, outcomes)
+
+    ##
+    # scoreStates
+    # Description: Scores a batch of described states. Their utilities are looked up in our table in
+    # a single pass, and states we haven't seen yet are added to the table (a frozen agent gives
+    # them expectedUtility instead). With the linear backend the whole feature matrix is scored
+    # against the weights instead.
+    #
+    # Parameters:
+    #   keys - The utility table key of each state
+    #   features - The feature matrix of the states
+    #   outcomes - An (iWon, iLost) pair for each state
+    #
+    # Returns: The utility of each state, as a numpy array if numpy is available, otherwise a list
+    ##
+    def scoreStates(self, keys, features, outcomes):
+        if self.valueBackend == LINEAR_BACKEND:
+            return self.linearModel.score(features)
+        table = self.consolidatedState
+        scores = []
+        if self.frozen:
+            for key, outcome in zip(keys, outcomes):
+                scores.append(table.get(key, expectedUtility(*outcome)))
+        elif self.learner is not None:
+            # The snapshot the learner has published last, which it replaces rather than changes
+            published = self.learner.published
+            self.addStates(keys, outcomes)
+            for key in keys:
+                utility = published.get(key)
+                scores.append(table.get(key) if utility is None else utility)
+        else:
+            self.addStates(keys, outcomes)
+            for key in keys:
+                scores.append(table.get(key))
+        if np is not None:
+            return np.array(scores, dtype=float)
+        return scores
+
+    ##
+    # describeStates
+    # Description: Consolidates each of a list of states, walking each state once
+    #
+    # Parameters:
+    #   states - The list of states
+    #
+    # Returns: [keys, features, outcomes] as given by stateFeatureMatrix
+    ##
+    def describeStates(self, states):
+        return stateFeatureMatrix(states, self.playerId)
+
+    ##
+    # addStates
+    # Description: Adds the states we haven't seen yet to the utility table
+    #
+    # Parameters:
+    #   keys - The utility table key of each state
+    #   outcomes - An (iWon, iLost) pair for each state
+    ##
+    def addStates(self, keys, outcomes):
+        table = self.consolidatedState
+        added = 0
+        for key, (iWon, iLost) in zip(keys, outcomes):
+            if key not in table:
+                table.set(key, initialUtility(iWon, iLost))
+                added += 1
+        self.profiler.count('tableHits', len(keys) - added)
+        self.profiler.count('tableMisses', added)
+
+    ##
+    # getAttack
+    # Description: The getAttack method is called on the player whenever an ant completes
+    # a move and has a valid attack. It is assumed that an attack will always be made
+    # because there is no strategic advantage from withholding an attack. The AIPlayer
+    # is passed a copy of the state which again contains the board and also a clone of
+    # the attacking ant. The player is also passed a list of coordinate tuples which
+    # represent valid locations for attack. Hint: a random AI can simply return one of
+    # these coordinates for a valid attack.
+    #
+    # Parameters:
+    #   currentState - The current state of the game at the time the Game is requesting
+    #       a move from the player. (GameState)
+    #   attackingAnt - A clone of the ant currently making the attack. (Ant)
+    #   enemyLocation - A list of coordinate locations for valid attacks (i.e.
+    #       enemies within range) ([list of 2-tuples of ints])
+    #
+    # Return: A coordinate that matches one of the entries of enemyLocations. ((int,int))
+    ##
+    def getAttack(self, currentState, attackingAnt, enemyLocations):
+        # Employ ancient roman battle techniques to defeat the enemy
+        return enemyLocations[0]
+
+    ##
+    # registerWin
+    # Description: The last method, registerWin, is called when the game ends and simply
+    # indicates to the AI whether it has won or lost the game. This is to help with
+    # learning algorithms to develop more successful strategies.
+    #
+    # Parameters:
+    #   hasWon - True if the player has won the game, False if the player lost. (Boolean)
+    #
+    def registerWin(self, hasWon):
+        # The end of the game must be learned from before it is saved
+        if self.learner is not None:
+            self.learner.flush()
+        # Each time your agent completes a game, save your current state utilities to a file.
+        if not self.frozen:
+            self.checkpoint()
+        self.endGame()
+
+    ##
+    # endGame
+    # Description: Gets ready for the next game, which starts with no visited states
+    ##
+    def endGame(self):
+        if self.learner is not None:
+            self.learner.flush()
+        if not self.frozen:
+            self.replayUpdate()
+            # Between games no traces or candidates refer to the states being forgotten
+            self.consolidatedState.trim(self.dataPath(UTILITY_LOG_FILE) if np is not None else None)
+            if self.episodeLog is not None:
+                self.episodeLog.endEpisode()
+        self.profiler.writeGame(self)
+        self.traces = {}
+        self.board = None
+        if self.linearModel is not None:
+            self.linearModel.resetTrace()
+
+    ##
+    # makePath
+    #
+    # Description: makePath is a modified version of createPathTowards in the AIPlayerUtils file. it will
+    #              create a path towards whatever your destination is, while also returning any ants that
+    #              are owned by the AI and are in the path. This is useful for moving ants out of the way
+    #              of other ants.
+    # Parameters:
+    #   currentState - The current state object for the game
+    #   sourceCoords - The coordinates to start the path at
+    #   targetCoords - The coordinates we are trying to get to
+    #   movement - The movement value for that particular ant
+    #
+    def makePath(self, currentState, sourceCoords, targetCoords, movement):
+        board = self.getBoard(currentState)
+        path = [sourceCoords]
+        antsInPath = []
+
+        # keep adding steps to the path until movement runs out
+        while (movement > 0):
+
+            found = False  # was a new step found to add to the path
+            distToTarget = board.stepCost(sourceCoords, targetCoords)
+            for coord in listAdjacent(sourceCoords):
+                # is this a step headed in the right direction?
+                if (board.stepCost(coord, targetCoords) < distToTarget):
+
+                    # how much movement does it cost to get there?
+                    moveCost = board.moveCost(coord)
+
+                    # if I have enough movement left then add it to the path
+                    if (moveCost <= movement):
+                        # add the step to the path
+                        found = True
+                        path.append(coord)
+
+                        # See if there's an ant there, if so, add it to our ant in path list
+                        ant = board.antAt(coord)
+                        if ant != None:
+                            if ant.player == PLAYER_TWO:
+                                antsInPath.append(ant)
+                            else:
+                                # If it is not our ant, then this is as far as we can go
+                                return [path, antsInPath]
+
+                        # restart the search from the new coordinate
+                        movement = movement - moveCost
+                        sourceCoords = coord
+                        break
+            if (not found):
+                break  # no usable steps found
+
+        return [path, antsInPath]
+
+    ##
+    # moveAntInPath
+    #
+    # Description: Generates a move object for any ant that is in the path of the given ant. The direction
+    #              the ant moves is rather arbitrary, it's only goal is to move out of the path, whatever
+    #              that means.
+    # Parameters:
+    #   currentState - The current state of the game
+    #   ant - The ant object we want to move
+    #   antDest - Where the ant is trying to go
+    #   antType - The type of the ant, used to find out movement
+    ##
+    def moveAntInPath(self, currentState, ant, antDest, antType):
+        board = self.getBoard(currentState)
+        pathWithAnts = self.makePath(currentState, ant.coords, antDest, UNIT_STATS[antType][MOVEMENT])
+        path = pathWithAnts[0]
+        antsInPath = pathWithAnts[1]
+
+        # If there are ants in the way and they haven't been moved, try to move them
+        for antInPath in antsInPath:
+            if not antInPath.hasMoved:
+                for cell in listReachableAdjacent(currentState, antInPath.coords,
+                                                  UNIT_STATS[antInPath.type][MOVEMENT]):
+                    if cell not in path and board.constrAt(cell) is None:
+                        path = createPathToward(currentState, antInPath.coords, cell,
+                                                UNIT_STATS[antInPath.type][MOVEMENT])
+                        return Move(MOVE_ANT, path, None)
+
+        # No ant can be moved
+        return None
+
+    ##
+    # getBoard
+    #
+    # Description: Gets the board index of the current game, building it the first time it is
+    #              needed once setup is done. Its occupancy is brought up to date the first time
+    #              it is asked about each new state, so opponent moves and dead ants are seen too.
+    # Parameters:
+    #   currentState - The current state of the game
+    ##
+    def getBoard(self, currentState):
+        if self.board is None:
+            self.board = BoardIndex(currentState)
+        elif currentState is not self.board.state:
+            self.board.sync(currentState)
+        return self.board
+
+    ##
+    #   findPathCost
+    #
+    #   Description: Calculates how many steps it would take to complete a path
+    #
+    #   Parameters:
+    #       path - The path in question, follows the format [(srcX, srcY), ..., (dstX, dstY)]
+    ##
+    def findPathCost(self, currentState, path):
+        # If our path isn't long enough or it is a cycle then cost is 0
+        if len(path) < 3 or path[0] == path[len(path) - 1]:
+            return 0
+
+        # Path starts at 0 cost
+        board = self.getBoard(currentState)
+        pathCost = 0
+        for cell in path:
+
+            # Get the cell cost, add it to our running total
+            pathCost += board.moveCost(cell)
+
+        return pathCost
+
+    ###
+    # checkpoint
+    #
+    # Description: Saves what we learned this game. Only the utilities that changed are appended to
+    # the utility log, so this costs the same no matter how big the table is. Once the log is big
+    # enough (see logNeedsCompaction) it is folded into the utility file by writeFile. Without numpy
+    # the whole table is pickled instead.
+    #
+    # Parameters:
+    #   self - the object that has called this function
+    ###
+    def checkpoint(self):
+        if self.frozen:
+            return
+        if not self.loaded:
+            self.loadTable()
+        if np is None:
+            self.writeFile()
+            return
+
+        self.consolidatedState.appendLog(self.dataPath(UTILITY_LOG_FILE))
+        self.writeWeights()
+        if self.logNeedsCompaction():
+            self.writeFile()
+
+    ###
+    # logNeedsCompaction
+    #
+    # Description: Checks whether the utility log has grown past compactFraction of the utility
+    # file. Going by the sizes on disk rather than games played means short sessions add up too.
+    # The log is never compacted while the table is served from shared memory, the utility file
+    # belongs to the process serving it then.
+    #
+    # Parameters:
+    #   self - the object that has called this function
+    ###
+    def logNeedsCompaction(self):
+        logFile = self.dataPath(UTILITY_LOG_FILE)
+        utilityFile = self.dataPath(UTILITY_FILE)
+        if os.environ.get(SHARED_TABLE_ENV) or not os.path.exists(logFile):
+            return False
+        fileBytes = os.path.getsize(utilityFile) if os.path.exists(utilityFile) else 0
+        return os.path.getsize(logFile) > max(self.compactFraction*fileBytes, COMPACT_MIN_LOG_BYTES)
+
+    ###
+    # writeFile
+    #
+    # Description: Writes the utilities from our consolidated states to our utility file (see
+    # UtilityTable.save) and empties the utility log, which the file now covers. Without numpy they
+    # are pickled instead.
+    #
+    # Parameters:
+    #   self - the object that has called this function
+    ###
+    def writeFile(self):
+        if self.frozen:
+            return
+        # Writing before we have read the file in would throw away what it holds
+        if not self.loaded:
+            self.loadTable()
+        if np is None:
+            # Opening the file
+            f = open(self.dataPath(PICKLE_FILE), 'wb')
+            # Writing the key -> utility dictionary to the output file
+            pickle.dump(self.consolidatedState.utilities, f)
+            # Closing the file
+            f.close()
+            return
+
+        self.consolidatedState.save(self.dataPath(UTILITY_FILE))
+        self.writeWeights()
+        # If we are killed before the log is emptied, replaying it just sets the same utilities again
+        open(self.dataPath(UTILITY_LOG_FILE), 'wb').close()
+
+    ###
+    # writeWeights
+    #
+    # Description: Saves the linear value function's weights next to the utility file
+    #
+    # Parameters:
+    #   self - the object that has called this function
+    ###
+    def writeWeights(self):
+        path = self.dataPath(WEIGHTS_FILE)
+        f = open(path + '.tmp', 'wb')
+        np.save(f, self.linearModel.weights)
+        f.close()
+        replaceFile(path + '.tmp', path)
+
+    ###
+    # readFile
+    #
+    # Description: Loads our consolidated states table from our utility file and replays the utility
+    # log on top of it. The file is memory mapped rather than read, so this is quick no matter how big
+    # the table is. If we only have an old pickle file it is converted to a utility file first (a
+    # frozen agent reads it into memory instead). A log that has outgrown the file is compacted into
+    # it.
+    #
+    # Parameters:
+    #   self - the object that has called this function
+    #
+    ###
+    def readFile(self):
+        utilityFile = self.dataPath(UTILITY_FILE)
+        pickleFile = self.dataPath(PICKLE_FILE)
+        logFile = self.dataPath(UTILITY_LOG_FILE)
+        weightsFile = self.dataPath(WEIGHTS_FILE)
+        if np is None:
+            self.consolidatedState = readPickleFile(pickleFile)
+            return
+
+        sharedName = os.environ.get(SHARED_TABLE_ENV)
+        if sharedName:
+            # The table is served by another process (see serveTable), which owns the utility file
+            self.consolidatedState = UtilityTable(SharedUtilities.attach(sharedName))
+        else:
+            if not os.path.exists(utilityFile) and os.path.exists(pickleFile):
+                if self.frozen:
+                    # A frozen agent writes nothing, so it reads the pickle file as it is
+                    self.consolidatedState = readPickleFile(pickleFile)
+                else:
+                    convertPickleFile(pickleFile, utilityFile)
+            if os.path.exists(utilityFile):
+                self.consolidatedState = UtilityTable(MappedUtilities(utilityFile))
+            elif not (self.frozen and os.path.exists(pickleFile)):
+                self.consolidatedState = UtilityTable()
+        if os.path.exists(logFile):
+            self.consolidatedState.replayLog(logFile)
+            # A log left over from sessions too short to compact is folded in now, so the next
+            # startup doesn't have to replay it again
+            if not self.frozen and self.logNeedsCompaction():
+                self.consolidatedState.save(utilityFile)
+                open(logFile, 'wb').close()
+        if os.path.exists(weightsFile):
+            self.linearModel.weights = np.load(weightsFile)
+
+    ##
+    # loadTable
+    # Description: Reads in our learned utilities the first time it is called, and does nothing
+    # after that. It is safe to call from the background loader and a move at the same time, the
+    # move waits for the loader to finish.
+    ##
+    def loadTable(self):
+        with self.loadLock:
+            if self.loaded:
+                return
+            if os.environ.get(SHARED_TABLE_ENV) or any(os.path.exists(self.dataPath(name))
+                   for name in (UTILITY_FILE, PICKLE_FILE, UTILITY_LOG_FILE)):
+                self.readFile()
+            self.consolidatedState.limit(self.tableCapacity, self.evictionPolicy)
+            self.loaded = True
+
+    ##
+    # dataPath
+    # Description: Gives the path of one of our learned files
+    #
+    # Parameters:
+    #   name - The file name, one of UTILITY_FILE, PICKLE_FILE, UTILITY_LOG_FILE or WEIGHTS_FILE
+    ##
+    def dataPath(self, name):
+        return os.path.join(self.dataDir, name)
+
+    ##
+    # hasWon(int)
+    # Description: Determines whether the game has ended in victory for the given player.
+    #
+    # Parameters:
+    #   playerId - The ID of the player being checked for winning (int)
+    #   currentState - The current state of the game
+    #
+    # Returns: True if the player with playerId has won the game.
+    ##
+    def hasWon(self, currentState, playerId):
+        return gameOutcome(currentState, playerId)[0]
+
+    ##
+    # reward(float)
+    # Description: Takes in a state and generates the reward for that given state.
+    #
+    # Parameters:
+    #   currentState - The current state of the game
+    #
+    # Returns: The reward for the given state
+    ##
+    def reward(self, currentState):
+        iWon, iLost = gameOutcome(currentState, self.playerId)
+        return self.outcomeReward(iWon, iLost)
+
+    ##
+    # outcomeReward(float)
+    # Description: Generates the reward for a state we have already found the outcome of
+    #
+    # Parameters:
+    #   iWon - A boolean variable telling us if we have won
+    #   iLost - A boolean variable telling us if we have lost
+    #
+    # Returns: The reward for the state
+    ##
+    def outcomeReward(self, iWon, iLost):
+        # If we have won, return a 1
+        if iWon:
+            return 1
+        # If we have lost, return a 0
+        elif iLost:
+            return 0
+        # If we haven't won or lost, return -0.01
+        else:
+            return -0.01
+
+    ##
+    # consolidatState
+    # Description: Takes a game state, consolidates it and adds it to our table of states if we
+    # haven't seen it before.
+    #
+    # Parameters:
+    #   currentState - The current state of the game
+    #
+    # Returns: The utility we have for the consolidated state
+    ##
+    def consolidatState(self, currentState):
+        # Creating a consolidated version of the current state
+        newState = Consolidation(currentState, self.playerId)
+        if self.frozen:
+            return self.consolidatedState.get(newState.getKey(), expectedUtility(newState.iWon, newState.iLost))
+        # Adding this state to our table of consolidated states
+        return self.consolidatedState.add(newState)
+
+    ##
+    # tdLearning
+    # Description: Performs one step of the TD(lambda) learning algorithm, using eligibility traces
+    # so only the states we have recently visited are updated
+    #
+    # Parameters:
+    #   cs - The current state of the game
+    #   nextState - The next state of the game we are going to be in
+    ##
+    def tdLearning(self,cs,nextState):
+        if self.frozen:
+            return
+        started = self.profiler.start()
+        keys, features, outcomes = self.describeStates([cs, nextState])
+        if self.valueBackend == TABLE_BACKEND:
+            self.addStates(keys, outcomes)
+        self.rememberTransition(keys, features, outcomes)
+        self.learnTransition(self.consolidatedState, self.linearModel, self.traces, keys, features, outcomes)
+        self.profiler.lap('tdLearning', started)
+
+    ##
+    # rememberTransition
+    # Description: Stores a described transition in our replay buffer, if we have one
+    #
+    # Parameters:
+    #   keys - The keys of the state we were in and the state we moved to
+    #   features - Their feature rows
+    #   outcomes - Their (iWon, iLost) pairs
+    ##
+    def rememberTransition(self, keys, features, outcomes):
+        if self.replay is not None:
+            self.replay.add(keys[0], keys[1], features[0], features[1],
+                            self.outcomeReward(*outcomes[0]), any(outcomes[0]))
+
+    ##
+    # learnTransition
+    # Description: The TD(lambda) step of tdLearning on a described transition. Both states must
+    # already be in the table.
+    #
+    # Parameters:
+    #   table - The utilities to learn, our UtilityTable or an AsyncLearner
+    #   model - The LinearValueModel to learn
+    #   traces - The eligibility traces of the states visited this game, state key -> trace
+    #   keys - The keys of the state we were in and the state we moved to
+    #   features - Their feature rows
+    #   outcomes - Their (iWon, iLost) pairs
+    ##
+    def learnTransition(self, table, model, traces, keys, features, outcomes):
+        reward = self.outcomeReward(*outcomes[0])
+        # The linear backend learns its weights instead of per state utilities
+        if self.valueBackend == LINEAR_BACKEND:
+            model.update(features[0], features[1], reward,
+                         self.learningRate, self.discountFact, self.traceDecay)
+            return
+
+        # How much better or worse things went than the utility of the state we were in predicted
+        error = reward + self.discountFact*table.get(keys[1]) - table.get(keys[0])
+        # Mark the state we were in as visited
+        traces[keys[0]] = traces.get(keys[0], 0.0) + 1
+        # Only the states we have visited recently are updated, in proportion to their trace.
+        # Traces fade each step and are dropped once they get small enough
+        fade = self.discountFact*self.traceDecay
+        for key, trace in list(traces.items()):
+            table.set(key, table.get(key) + self.learningRate*error*trace)
+            trace = trace*fade
+            if trace < self.traceCutoff:
+                del traces[key]
+            else:
+                traces[key] = trace
+
+    ##
+    # replayUpdate
+    # Description: Learns again from minibatches of past transitions held in our replay buffer.
+    # Each minibatch is one vectorized TD(0) step, weighted to undo the bias of prioritized
+    # sampling, after which the priorities of the sampled transitions are set to their new errors.
+    ##
+    def replayUpdate(self):
+        replay = self.replay
+        if replay is None or not len(replay) or self.frozen:
+            return
+        for batch in range(0, self.replayBatches):
+            indices, weights = replay.sample(self.replayBatchSize, self.prioritizedReplay)
+            if self.valueBackend == LINEAR_BACKEND:
+                errors = self.linearModel.batchUpdate(
+                    replay.features[indices], replay.nextFeatures[indices], replay.rewards[indices],
+                    replay.terminals[indices], weights, self.learningRate, self.discountFact)
+            else:
+                errors = self.tableBatchUpdate(replay.keys[indices], replay.nextKeys[indices],
+                                               replay.rewards[indices], replay.terminals[indices],
+                                               weights)
+            replay.updatePriorities(indices, errors)
+
+    ##
+    # learnEpisode
+    # Description: Runs an offline TD(0) pass over a game read back from an episode log (see
+    # readEpisodes), learning from each state we chose and the one we chose after it in a single
+    # vectorized step
+    #
+    # Parameters:
+    #   episode - The columns of the game's turns
+    ##
+    def learnEpisode(self, episode):
+        keys = episode['key']
+        if len(keys) < 2 or self.frozen:
+            return
+        rewards = episode['reward'][:-1].astype(float)
+        # The first two fields of a key are its win/loss flags
+        terminals = (keys[:-1, 0] != 0) | (keys[:-1, 1] != 0)
+        weights = np.ones(len(keys) - 1)
+        if self.valueBackend == LINEAR_BACKEND:
+            features = episode['features']
+            self.linearModel.batchUpdate(features[:-1], features[1:], rewards, terminals, weights,
+                                         self.learningRate, self.discountFact)
+        else:
+            self.tableBatchUpdate(keys[:-1], keys[1:], rewards, terminals, weights)
+
+    ##
+    # tableBatchUpdate
+    # Description: One TD(0) step on a minibatch of transitions in the utility table. Once the game
+    # is over there is nothing to bootstrap from, so a terminal transition only learns its reward.
+    #
+    # Parameters:
+    #   keyRows - The state keys, one per row (numpy array)
+    #   nextKeyRows - The keys of the states moved to (numpy array)
+    #   rewards - The reward of each transition (numpy array)
+    #   terminals - Whether each transition ended the game (numpy array)
+    #   weights - How much each transition counts (numpy array)
+    #
+    # Returns: The TD error of each transition (numpy array)
+    ##
+    def tableBatchUpdate(self, keyRows, nextKeyRows, rewards, terminals, weights):
+        table = self.consolidatedState
+        # tolist gives back plain ints, which hash the same as the keys in the table
+        keys = [tuple(row) for row in keyRows.tolist()]
+        nextKeys = [tuple(row) for row in nextKeyRows.tolist()]
+        # The first two fields of a key are its win/loss flags
+        self.addStates(keys + nextKeys, [key[:2] for key in keys + nextKeys])
+        utilities = np.array([table.get(key) for key in keys], dtype=float)
+        nextUtilities = np.array([table.get(key) for key in nextKeys], dtype=float)
+        errors = rewards + self.discountFact*np.where(terminals, 0.0, nextUtilities) - utilities
+        # Applied one at a time so a state sampled twice gets both steps
+        for key, step in zip(keys, (self.learningRate*weights*errors).tolist()):
+            table.set(key, table.get(key) + step)
+        return errors
+
+##
+# UtilityTable
+# Description: A hash table mapping consolidated state keys (see Consolidation.getKey) to their
+# learned utilities, so looking up a state costs the same no matter how many states we have seen.
+# The table can sit on top of a memory mapped utility file: states we have learned about since it
+# was loaded are kept in a dictionary, utilities replayed from the utility log in another, and
+# everything else is looked up in the file.
+#
+# The dictionary of states can be given a capacity (see limit). Each of its states then keeps track
+# of when it was last visited (looked up or set), how often it was visited and how often its
+# utility was set, and trim forgets the states the eviction policy ranks lowest once there are too
+# many. A forgotten state always reads back as its saved utility: trim first appends any change
+# not yet in the utility log to it and keeps the utility with the replayed ones, which the utility
+# file takes over at the next save. Without a log to write to, it reads back as whatever the file
+# has for it, if anything.
+#
+# Variables:
+#   utilities - The dictionary of state key -> utility
+#   logged - The dictionary of stateHash(key) -> utility replayed from the utility log
+#   base - The MappedUtilities the table was loaded from, or None
+#   changed - The keys whose utility changed since the last appendLog or save
+#   capacity - The most states utilities keeps after a trim, or None for no limit
+#   policy - Which states are forgotten first: EVICT_LEAST_RECENT, EVICT_FEWEST_VISITS or
+#            EVICT_LEAST_CONFIDENT
+##
+class UtilityTable(object):
+
+    def __init__(self, base=None, capacity=None, policy=None):
+        self.utilities = {}
+        self.logged = {}
+        self.base = base
+        self.changed = set()
+        self.evictions = 0
+        self.trims = 0
+        self.clock = 0
+        self.lastVisit = {}
+        self.visits = {}
+        self.updates = {}
+        self.limit(capacity, policy or EVICT_LEAST_RECENT)
+
+    def __len__(self):
+        if self.base is None and not self.logged:
+            return len(self.utilities)
+        hashes = set(self.logged)
+        for key in self.utilities:
+            hashes.add(stateHash(key))
+        newStates = 0
+        for keyHash in hashes:
+            if self.base is None or self.base.get(keyHash) is None:
+                newStates += 1
+        return (len(self.base) if self.base is not None else 0) + newStates
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    ##
+    # get
+    # Description: Looks up the utility for a state key
+    #
+    # Parameters:
+    #   key - The state key to look up
+    #   default - What to return if we have never seen the state
+    ##
+    def get(self, key, default=None):
+        utility = self.utilities.get(key)
+        if utility is not None and self.capacity is not None:
+            self.visit(key)
+        if utility is None and (self.logged or self.base is not None):
+            keyHash = stateHash(key)
+            utility = self.logged.get(keyHash)
+            if utility is None and self.base is not None:
+                utility = self.base.get(keyHash)
+        if utility is None:
+            return default
+        return utility
+
+    ##
+    # set
+    # Description: Stores the utility for a state key
+    #
+    # Parameters:
+    #   key - The state key
+    #   utility - The new utility of the state
+    ##
+    def set(self, key, utility):
+        self.utilities[key] = utility
+        self.changed.add(key)
+        if self.capacity is not None:
+            self.visit(key)
+            self.updates[key] = self.updates.get(key, 0) + 1
+
+    ##
+    # visit
+    # Description: Notes that a state in the dictionary was just used
+    #
+    # Parameters:
+    #   key - The state key
+    ##
+    def visit(self, key):
+        self.clock += 1
+        self.lastVisit[key] = self.clock
+        self.visits[key] = self.visits.get(key, 0) + 1
+
+    ##
+    # limit
+    # Description: Sets how many states the table keeps in memory and which it forgets first
+    #
+    # Parameters:
+    #   capacity - The most states to keep, or None for no limit
+    #   policy - EVICT_LEAST_RECENT, EVICT_FEWEST_VISITS or EVICT_LEAST_CONFIDENT
+    ##
+    def limit(self, capacity, policy):
+        if policy not in EVICTION_POLICIES:
+            raise ValueError("Unknown eviction policy %r" % (policy,))
+        self.capacity = capacity
+        self.policy = policy
+
+    ##
+    # trim
+    # Description: Forgets states until the table is back under its capacity. It forgets a few more
+    # than it has to (EVICTION_SLACK of the capacity) so that it doesn't need to rank the states
+    # again straight away. States forgotten are ranked by the eviction policy, ties going to the
+    # least recently visited. Their utilities are kept with the replayed ones, after appending any
+    # that changed since the last appendLog to the utility log.
+    #
+    # Parameters:
+    #   logPath - The utility log, or None if the table isn't saved to one
+    #
+    # Returns: How many states were forgotten
+    ##
+    def trim(self, logPath=None):
+        if self.capacity is None or len(self.utilities) <= self.capacity:
+            return 0
+        keep = int(self.capacity * (1 - EVICTION_SLACK))
+        lastVisit = self.lastVisit
+        if self.policy == EVICT_FEWEST_VISITS:
+            counts = self.visits
+        elif self.policy == EVICT_LEAST_CONFIDENT:
+            counts = self.updates
+        else:
+            counts = None
+        if counts is None:
+            rank = lambda key: lastVisit.get(key, 0)
+        else:
+            rank = lambda key: (counts.get(key, 0), lastVisit.get(key, 0))
+        victims = heapq.nsmallest(len(self.utilities) - keep, self.utilities, key=rank)
+
+        if logPath is not None:
+            self.appendLog(logPath, [key for key in victims if key in self.changed])
+        for key in victims:
+            utility = self.utilities.pop(key)
+            lastVisit.pop(key, None)
+            self.visits.pop(key, None)
+            self.updates.pop(key, None)
+            self.changed.discard(key)
+            if logPath is not None:
+                self.logged[stateHash(key)] = utility
+        self.evictions += len(victims)
+        self.trims += 1
+        return len(victims)
+
+    ##
+    # stats
+    # Description: Reports how full the table is and how much it has forgotten
+    ##
+    def stats(self):
+        return {'capacity': self.capacity,
+                'policy': self.policy,
+                'occupancy': len(self.utilities),
+                'fill': len(self.utilities) / float(self.capacity) if self.capacity else None,
+                'logged': len(self.logged),
+                'evictions': self.evictions,
+                'trims': self.trims}
+
+    ##
+    # add
+    # Description: Adds a consolidated state to the table, with its initialUtility, if it is not
+    # already in it
+    #
+    # Parameters:
+    #   state - The Consolidation object to add
+    #
+    # Returns: The utility stored for the state
+    ##
+    def add(self, state):
+        key = state.getKey()
+        utility = self.get(key)
+        if utility is None:
+            utility = initialUtility(state.iWon, state.iLost)
+            self.set(key, utility)
+        return utility
+
+    ##
+    # items
+    # Description: Lists the states we have learned about since the table was loaded
+    ##
+    def items(self):
+        return list(self.utilities.items())
+
+    ##
+    # arrays
+    # Description: Gathers the whole table, what we learned since loading on top of the base
+    #
+    # Returns: [keys, values] where keys are the sorted stateHash of every state key (numpy array)
+    #          and values their utilities (numpy array)
+    ##
+    def arrays(self):
+        keys = np.array([stateHash(key) for key in self.utilities] + list(self.logged.keys()), dtype='<u8')
+        values = np.array(list(self.utilities.values()) + list(self.logged.values()), dtype='<f4')
+        if self.base is not None:
+            keys = np.concatenate([keys, self.base.keys])
+            values = np.concatenate([values, self.base.values])
+        # np.unique keeps the first copy of each key, which is the one we have learned since loading
+        keys, index = np.unique(keys, return_index=True)
+        values = values[index]
+        return keys, values
+
+    ##
+    # approximateSize
+    # Description: Counts the states learned since loading, in the utility log and in the base
+    # separately. A state in more than one of them is counted more than once, as telling them apart
+    # means hashing every key (see __len__).
+    ##
+    def approximateSize(self):
+        size = len(self.utilities) + len(self.logged)
+        if self.base is not None:
+            size += len(self.base)
+        return size
+
+    ##
+    # save
+    # Description: Writes the whole table to a utility file. The file starts with a header
+    # (UTILITY_FILE_MAGIC, the format version and the number of states), followed by the sorted
+    # 64 bit hashes of the state keys and then a float32 utility for each of them. The file is
+    # written next to its destination and renamed over it, so a crash never leaves half a file. If
+    # the table is mapped from the file being replaced, or from no file at all, it maps the new one
+    # after (letting go of the old one first, as Windows won't replace a mapped file). The new file
+    # holds the replayed utilities too, so they are let go of.
+    #
+    # Parameters:
+    #   path - Where to write the table
+    ##
+    def save(self, path):
+        keys, values = self.arrays()
+        tmpPath = path + '.tmp'
+        f = open(tmpPath, 'wb')
+        f.write(struct.pack(UTILITY_FILE_HEADER, UTILITY_FILE_MAGIC, UTILITY_FILE_VERSION, len(keys)))
+        f.write(keys.astype('<u8').tobytes())
+        f.write(values.astype('<f4').tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+        f.close()
+        mapped = (isinstance(self.base, MappedUtilities) and
+                  os.path.abspath(self.base.path) == os.path.abspath(path))
+        if mapped:
+            self.base.close()
+        replaceFile(tmpPath, path)
+        if mapped or self.base is None:
+            # The file holds everything now, including the utilities of the states we forgot
+            self.base = MappedUtilities(path)
+            self.logged = {}
+        self.changed = set()
+
+    ##
+    # appendLog
+    # Description: Appends the utilities that changed since the last call to the utility log. Each
+    # call writes one block: a header (UTILITY_LOG_MAGIC and the number of records), a (key hash,
+    # float32 utility) record per state and a CRC32 of the records. The block is flushed to disk
+    # before returning, and a block cut short by a crash fails its check and is ignored on replay.
+    #
+    # Parameters:
+    #   path - The utility log to append to
+    #   keys - The keys to append, by default all that changed
+    ##
+    def appendLog(self, path, keys=None):
+        keys = list(self.changed if keys is None else keys)
+        if not keys:
+            return
+        records = np.zeros(len(keys), dtype=UTILITY_LOG_RECORD)
+        records['key'] = [stateHash(key) for key in keys]
+        records['utility'] = [self.utilities[key] for key in keys]
+        data = records.tobytes()
+
+        f = open(path, 'ab')
+        f.write(struct.pack(UTILITY_LOG_HEADER, UTILITY_LOG_MAGIC, len(records)))
+        f.write(data)
+        f.write(struct.pack('<I', zlib.crc32(data) & 0xffffffff))
+        f.flush()
+        os.fsync(f.fileno())
+        f.close()
+        self.changed.difference_update(keys)
+
+    ##
+    # replayLog
+    # Description: Applies the blocks of a utility log (see appendLog) to the table, oldest first.
+    # Replaying stops at the first block that is incomplete or fails its check.
+    #
+    # Parameters:
+    #   path - The utility log to replay
+    ##
+    def replayLog(self, path):
+        f = open(path, 'rb')
+        data = f.read()
+        f.close()
+
+        headerSize = struct.calcsize(UTILITY_LOG_HEADER)
+        recordSize = np.dtype(UTILITY_LOG_RECORD).itemsize
+        offset = 0
+        while offset + headerSize <= len(data):
+            magic, count = struct.unpack(UTILITY_LOG_HEADER, data[offset:offset + headerSize])
+            start = offset + headerSize
+            end = start + count*recordSize
+            if magic != UTILITY_LOG_MAGIC or end + 4 > len(data):
+                break
+            records = data[start:end]
+            if struct.unpack('<I', data[end:end + 4])[0] != zlib.crc32(records) & 0xffffffff:
+                break
+            records = np.frombuffer(records, dtype=UTILITY_LOG_RECORD)
+            self.logged.update(zip(records['key'].tolist(), records['utility'].tolist()))
+            offset = end + 4
+
+
+##
+# BoardIndex
+# Description: Precomputed facts about the board of one game. The cost of moving between any two
+# cells (taking the move cost of the constructions on the way into account) is worked out once,
+# since constructions don't move after setup. Which construction and ant is on each cell is kept in
+# grids so finding them is a lookup rather than a search. The grids are copied from the last state
+# synced, so asking about the same state again costs nothing.
+#
+# Variables:
+#   state - The state the grids were last synced with
+#   moveCosts - The cost of moving onto each cell
+#   stepCosts - The cheapest cost of getting from each cell to each other cell
+#   constrs - The construction on each cell, or None
+#   ants - The ant on each cell, or None
+##
+class BoardIndex(object):
+
+    def __init__(self, currentState):
+        self.constrs = [None]*(BOARD_LENGTH*BOARD_LENGTH)
+        self.ants = [None]*(BOARD_LENGTH*BOARD_LENGTH)
+        self.sync(currentState)
+        self.moveCosts = [1]*(BOARD_LENGTH*BOARD_LENGTH)
+        for cell in range(0, len(self.constrs)):
+            if self.constrs[cell] is not None:
+                self.moveCosts[cell] = CONSTR_STATS[self.constrs[cell].type][MOVE_COST]
+        self.stepCosts = [self.costsFrom(cell) for cell in range(0, len(self.constrs))]
+
+    ##
+    # costsFrom
+    # Description: Finds the cheapest cost of getting from a cell to every cell with Dijkstra's
+    # algorithm
+    #
+    # Parameters:
+    #   source - The cell to start from
+    ##
+    def costsFrom(self, source):
+        costs = [None]*len(self.moveCosts)
+        queue = [(0, source)]
+        while queue:
+            cost, cell = heapq.heappop(queue)
+            if costs[cell] is not None:
+                continue
+            costs[cell] = cost
+            for coord in listAdjacent(cellCoords(cell)):
+                nextCell = coordsCell(coord)
+                if costs[nextCell] is None:
+                    heapq.heappush(queue, (cost + self.moveCosts[nextCell], nextCell))
+        return costs
+
+    ##
+    # sync
+    # Description: Brings the construction and ant grids up to date with a state
+    #
+    # Parameters:
+    #   currentState - The state to copy the grids from
+    ##
+    def sync(self, currentState):
+        self.state = currentState
+        self.constrs = [None]*len(self.constrs)
+        self.ants = [None]*len(self.ants)
+        for inv in currentState.inventories:
+            for constr in inv.constrs:
+                self.constrs[coordsCell(constr.coords)] = constr
+            for ant in inv.ants:
+                self.ants[coordsCell(ant.coords)] = ant
+
+    def constrAt(self, coords):
+        return self.constrs[coordsCell(coords)]
+
+    def antAt(self, coords):
+        return self.ants[coordsCell(coords)]
+
+    def moveCost(self, coords):
+        return self.moveCosts[coordsCell(coords)]
+
+    def stepCost(self, source, target):
+        return self.stepCosts[coordsCell(source)][coordsCell(target)]
+
+
+##
+# coordsCell / cellCoords
+# Description: Convert between board coordinates and the index of their cell in a BoardIndex grid
+##
+def coordsCell(coords):
+    return coords[0]*BOARD_LENGTH + coords[1]
+
+
+def cellCoords(cell):
+    return (cell // BOARD_LENGTH, cell % BOARD_LENGTH)
+
+
+##
+# TranspositionCache
+# Description: Remembers work done on positions we have seen before, such as their legal moves and
+# successor states, so it doesn't have to be redone when they come up again. Once it is full the
+# least recently used entry is dropped.
+#
+# Variables:
+#   capacity - The most entries to keep
+#   entries - The cached values, least recently used first
+#   hits - How many lookups found their entry
+#   misses - How many lookups didn't
+##
+class TranspositionCache(object):
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    ##
+    # get
+    # Description: Looks up an entry, marking it as the most recently used
+    #
+    # Parameters:
+    #   key - The entry to look up
+    #
+    # Returns: The cached value, or None if it isn't cached
+    ##
+    def get(self, key):
+        value = self.entries.pop(key, None)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries[key] = value
+        return value
+
+    ##
+    # put
+    # Description: Caches a value, dropping the least recently used entry if the cache is full
+    #
+    # Parameters:
+    #   key - The entry to cache
+    #   value - The value to cache
+    ##
+    def put(self, key, value):
+        self.entries.pop(key, None)
+        self.entries[key] = value
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    ##
+    # hitRate
+    # Description: The fraction of lookups that found their entry
+    ##
+    def hitRate(self):
+        lookups = self.hits + self.misses
+        return self.hits / float(lookups) if lookups else 0.0
+
+
+##
+# Profiler
+# Description: Times the stages of every turn (listing moves, generating and consolidating
+# successors, looking up utilities and learning) and counts how often lookups hit. A disabled
+# profiler returns straight away from every call without reading the clock, so it can stay in
+# the hot path. At the end of each game a summary is written as JSON along with a CSV of the
+# per turn timings, named profile-<run>-<game>.
+#
+# Variables:
+#   outputDir - The directory the reports are written to, or None if profiling is off
+#   run - Tells the reports of this profiler apart from other agents' and processes'
+#   turns - The stage timings (in seconds) of each turn this game
+#   counters - The event counts of this game
+##
+class Profiler(object):
+
+    # Numbers the profilers of a process, so two made in the same millisecond get different runs
+    created = itertools.count()
+
+    def __init__(self, outputDir=None, run=None):
+        self.outputDir = outputDir
+        self.enabled = outputDir is not None
+        self.run = run
+        self.games = 0
+        self.reset()
+
+    ##
+    # fromEnvironment
+    # Description: Creates the profiler asked for by the PROFILE_ENV environment variable
+    #
+    # Parameters:
+    #   playerId - The id of the player being profiled
+    ##
+    @staticmethod
+    def fromEnvironment(playerId):
+        outputDir = os.environ.get(PROFILE_ENV)
+        if not outputDir:
+            return Profiler()
+        # Hold on to where the reports go in case the working directory changes
+        outputDir = os.path.abspath(outputDir)
+        if not os.path.isdir(outputDir):
+            os.makedirs(outputDir)
+        return Profiler(outputDir, '%d-%d-%d-%d' % (int(time.time() * 1000), os.getpid(), playerId,
+                                                    next(Profiler.created)))
+
+    ##
+    # reset
+    # Description: Forgets the timings and counts of the current game
+    ##
+    def reset(self):
+        self.turns = []
+        self.current = {}
+        self.counters = {}
+
+    ##
+    # start
+    # Description: Reads the clock at the start of a stage
+    #
+    # Returns: The time, or None if profiling is off
+    ##
+    def start(self):
+        if not self.enabled:
+            return None
+        return default_timer()
+
+    ##
+    # lap
+    # Description: Adds the time since started to a stage of the current turn
+    #
+    # Parameters:
+    #   stage - The name of the stage
+    #   started - The time the stage started (from start or lap)
+    #
+    # Returns: The time, so the next stage can start from it
+    ##
+    def lap(self, stage, started):
+        if not self.enabled:
+            return None
+        now = default_timer()
+        self.current[stage] = self.current.get(stage, 0.0) + now - started
+        return now
+
+    ##
+    # startTurn
+    # Description: Starts timing a new turn
+    #
+    # Returns: The time the turn started
+    ##
+    def startTurn(self):
+        if not self.enabled:
+            return None
+        self.current = {}
+        return default_timer()
+
+    ##
+    # endTurn
+    # Description: Records the time the whole turn took. Learning done after the move is chosen
+    # is still added to this turn's timings.
+    #
+    # Parameters:
+    #   started - The time the turn started (from startTurn)
+    ##
+    def endTurn(self, started):
+        if not self.enabled:
+            return
+        self.current['total'] = default_timer() - started
+        self.turns.append(self.current)
+
+    ##
+    # count
+    # Description: Counts an event of the current game
+    #
+    # Parameters:
+    #   name - The name of the counter
+    #   amount - How much to add to it
+    ##
+    def count(self, name, amount=1):
+        if not self.enabled:
+            return
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    ##
+    # summary
+    # Description: Summarizes the current game: turn latency percentiles, the total time of each
+    # stage, the counters, the approximate size of the utility table and the hit rates of our
+    # lookups
+    #
+    # Parameters:
+    #   agent - The AIPlayer being profiled
+    ##
+    def summary(self, agent):
+        totals = sorted(turn['total'] for turn in self.turns if 'total' in turn)
+        table = agent.consolidatedState
+        stages = {}
+        for turn in self.turns:
+            for stage, seconds in turn.items():
+                if stage != 'total':
+                    stages[stage] = stages.get(stage, 0.0) + seconds
+        hits = self.counters.get('tableHits', 0)
+        lookups = hits + self.counters.get('tableMisses', 0)
+        return {'game': self.games,
+                'pid': os.getpid(),
+                'turns': len(totals),
+                'p50': percentile(totals, 0.5),
+                'p99': percentile(totals, 0.99),
+                'max': totals[-1] if totals else 0.0,
+                'mean': sum(totals) / len(totals) if totals else 0.0,
+                'stages': stages,
+                'counters': dict(self.counters),
+                'tableSize': table.approximateSize(),
+                'tableStats': table.stats(),
+                'tableHitRate': hits / float(lookups) if lookups else 0.0,
+                'transpositionHitRate': agent.transpositions.hitRate(),
+                'transpositionSize': len(agent.transpositions)}
+
+    ##
+    # writeGame
+    # Description: Writes the report of the current game and starts on the next one. The summary
+    # goes to profile-<pid>-<game>.json and the per turn timings to profile-<pid>-<game>.csv.
+    #
+    # Parameters:
+    #   agent - The AIPlayer being profiled
+    ##
+    def writeGame(self, agent):
+        if not self.enabled:
+            return
+        if self.turns:
+            name = os.path.join(self.outputDir, 'profile-%s-%d' % (self.run, self.games))
+            with open(name + '.json', 'w') as f:
+                json.dump(self.summary(agent), f, indent=2, sort_keys=True)
+            stages = sorted(set(stage for turn in self.turns for stage in turn))
+            with open(name + '.csv', 'w') as f:
+                writer = csv.writer(f)
+                writer.writerow(['turn'] + stages)
+                for i, turn in enumerate(self.turns):
+                    writer.writerow([i] + [turn.get(stage, 0.0) for stage in stages])
+        self.games += 1
+        self.reset()
+
+
+##
+# percentile
+# Description: Picks a percentile out of a sorted list by the nearest rank
+#
+# Parameters:
+#   values - The sorted values
+#   fraction - Which percentile to take, between 0 and 1
+##
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    rank = int(round(fraction * (len(values) - 1)))
+    return values[rank]
+
+
+##
+# MappedUtilities
+# Description: A read only view of a utility file (see UtilityTable.save). The file is memory
+# mapped, so loading it is instant and every process that opens the same file shares its pages.
+#
+# Variables:
+#   path - The utility file
+#   keys - The sorted state key hashes (numpy memmap)
+#   values - The utility of each key (numpy memmap)
+##
+class MappedUtilities(object):
+
+    def __init__(self, path):
+        self.path = path
+        f = open(path, 'rb')
+        header = f.read(struct.calcsize(UTILITY_FILE_HEADER))
+        f.close()
+        magic, version, count = struct.unpack(UTILITY_FILE_HEADER, header)
+        if magic != UTILITY_FILE_MAGIC or version != UTILITY_FILE_VERSION:
+            # The state keys change between versions, so an older file can't be read. Convert the
+            # pickle file it was made from again instead.
+            raise IOError("%s is not a version %d utility file" % (path, UTILITY_FILE_VERSION))
+
+        offset = len(header)
+        if count == 0:
+            # numpy can't map an empty array
+            self.keys = np.zeros(0, dtype='<u8')
+            self.values = np.zeros(0, dtype='<f4')
+        else:
+            self.keys = np.memmap(path, dtype='<u8', mode='r', offset=offset, shape=(count,))
+            self.values = np.memmap(path, dtype='<f4', mode='r', offset=offset + 8*count, shape=(count,))
+
+    def __len__(self):
+        return len(self.keys)
+
+    ##
+    # get
+    # Description: Looks up the utility of a state key hash with a binary search
+    #
+    # Parameters:
+    #   keyHash - The stateHash of the key to look up
+    #   default - What to return if the state isn't in the file
+    ##
+    def get(self, keyHash, default=None):
+        index = np.searchsorted(self.keys, keyHash)
+        if index < len(self.keys) and self.keys[index] == keyHash:
+            return float(self.values[index])
+        return default
+
+    ##
+    # close
+    # Description: Lets go of the mapping, which is unmapped once nothing else refers to the
+    # arrays. The view can't be used after.
+    ##
+    def close(self):
+        self.keys = self.values = None
+
+
+##
+# SharedUtilities
+# Description: A utility store in a shared memory segment, so any number of processes on the host
+# can look utilities up without a copy of their own. It can stand in for MappedUtilities as the base
+# of a UtilityTable. The segment holds an open addressing hash table (linear probing) from state
+# key hashes to float32 utilities, after a header of the table's capacity, how many states it
+# holds and a sequence number. A single process writes to it, readers never lock: the writer makes
+# the sequence number odd while it is changing the table and even again after, and a reader that
+# sees it odd or changed while it was looking retries (a seqlock). The training harness shares its
+# table with its workers this way, and --serve-table shares a learned table with every agent that
+# has SHARED_TABLE_ENV set to its name.
+#
+# Variables:
+#   name - The name of the shared memory segment
+#   capacity - The number of slots in the hash table (a power of two)
+#   header - [SHARED_TABLE_MAGIC, capacity, count, sequence] (numpy array in the segment)
+#   slots - The key hash in each slot, 0 for an empty slot (numpy array in the segment)
+#   utilities - The utility in each slot (numpy array in the segment)
+##
+class SharedUtilities(object):
+
+    def __init__(self, memory, owner):
+        self.memory = memory
+        self.owner = owner
+        self.name = memory.name
+        self.header = np.ndarray(4, dtype='<u8', buffer=memory.buf)
+        if self.header[0] != SHARED_TABLE_MAGIC:
+            raise IOError("%s is not a shared utility table" % self.name)
+        self.capacity = int(self.header[1])
+        self.slots = np.ndarray(self.capacity, dtype='<u8', buffer=memory.buf, offset=32)
+        self.utilities = np.ndarray(self.capacity, dtype='<f4', buffer=memory.buf,
+                                    offset=32 + 8*self.capacity)
+
+    ##
+    # create
+    # Description: Creates an empty shared table. The process that creates it is its writer.
+    #
+    # Parameters:
+    #   states - How many states it should be able to hold
+    ##
+    @staticmethod
+    def create(states):
+        if shared_memory is None:
+            raise ImportError("Sharing a utility table in memory needs Python 3.8 or later")
+        capacity = 1
+        while capacity * SHARED_TABLE_LOAD < states:
+            capacity *= 2
+        memory = shared_memory.SharedMemory(create=True, size=32 + 12*capacity)
+        header = np.ndarray(4, dtype='<u8', buffer=memory.buf)
+        header[:] = (SHARED_TABLE_MAGIC, capacity, 0, 0)
+        np.ndarray(capacity, dtype='<u8', buffer=memory.buf, offset=32)[:] = 0
+        return SharedUtilities(memory, True)
+
+    ##
+    # attach
+    # Description: Opens a shared table another process created, for reading
+    #
+    # Parameters:
+    #   name - The name of its segment
+    ##
+    @staticmethod
+    def attach(name):
+        if shared_memory is None:
+            raise ImportError("Sharing a utility table in memory needs Python 3.8 or later")
+        # Only the writer may remove the segment, otherwise it would go when the first reader exits
+        try:
+            memory = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Before Python 3.13 every process that opens a segment tracks it. Processes started by
+            # multiprocessing share their parent's resource tracker, which already tracks it, so
+            # only other processes have to stop tracking it
+            memory = shared_memory.SharedMemory(name=name)
+            if os.name == 'posix' and multiprocessing.parent_process() is None:
+                resource_tracker.unregister('/' + memory.name, 'shared_memory')
+        return SharedUtilities(memory, False)
+
+    def __len__(self):
+        return int(self.header[2])
+
+    ##
+    # get
+    # Description: Looks up the utility of a state key hash
+    #
+    # Parameters:
+    #   keyHash - The stateHash of the key to look up
+    #   default - What to return if the state isn't in the table
+    ##
+    def get(self, keyHash, default=None):
+        target = np.uint64(keyHash or 1)
+        header = self.header
+        while True:
+            sequence = header[3]
+            if sequence & 1:
+                # The writer is part way through an update
+                time.sleep(0)
+                continue
+            slot = self.find(target)
+            utility = float(self.utilities[slot]) if self.slots[slot] == target else default
+            if header[3] == sequence:
+                return utility
+
+    ##
+    # find
+    # Description: Finds the slot a key hash is in, or the empty slot it would go in
+    #
+    # Parameters:
+    #   target - The key hash (numpy uint64, never 0)
+    ##
+    def find(self, target):
+        mask = self.capacity - 1
+        slots = self.slots
+        slot = int(target) & mask
+        while slots[slot] != target and slots[slot] != 0:
+            slot = (slot + 1) & mask
+        return slot
+
+    ##
+    # update
+    # Description: Sets the utilities of a batch of state key hashes, as one change readers either
+    # see all of or none of. Only the process that created the table may call this.
+    #
+    # Parameters:
+    #   keyHashes - The stateHash of each state
+    #   utilities - The new utility of each state
+    ##
+    def update(self, keyHashes, utilities):
+        if not self.owner:
+            raise IOError("Only the process that created %s can write to it" % self.name)
+        header = self.header
+        header[3] += 1
+        try:
+            for keyHash, utility in zip(keyHashes, utilities):
+                target = np.uint64(int(keyHash) or 1)
+                slot = self.find(target)
+                if self.slots[slot] == 0:
+                    if header[2] + 1 > self.capacity * SHARED_TABLE_LOAD:
+                        raise MemoryError("The shared utility table %s is full" % self.name)
+                    self.slots[slot] = target
+                    header[2] += 1
+                self.utilities[slot] = utility
+        finally:
+            header[3] += 1
+
+    ##
+    # fromTable
+    # Description: Creates a shared table holding everything a UtilityTable holds (see
+    # UtilityTable.arrays), with room for at least as many states again
+    #
+    # Parameters:
+    #   table - The UtilityTable
+    #   states - The fewest states it should be able to hold
+    ##
+    @staticmethod
+    def fromTable(table, states):
+        keys, values = table.arrays()
+        shared = SharedUtilities.create(max(states, 2*len(keys)))
+        shared.update(keys, values)
+        return shared
+
+    ##
+    # hasRoom
+    # Description: Checks whether some more states fit in the table
+    #
+    # Parameters:
+    #   states - How many states
+    ##
+    def hasRoom(self, states):
+        return len(self) + states <= self.capacity * SHARED_TABLE_LOAD
+
+    ##
+    # keys, values
+    # Description: The key hashes in the table, sorted, and their utilities. Lets the table be saved
+    # like a MappedUtilities (see UtilityTable.save).
+    ##
+    @property
+    def keys(self):
+        return np.sort(self.slots[self.slots != 0])
+
+    @property
+    def values(self):
+        occupied = self.slots != 0
+        order = np.argsort(self.slots[occupied])
+        return self.utilities[occupied][order]
+
+    ##
+    # close
+    # Description: Lets go of the segment. The writer removes it as well.
+    ##
+    def close(self):
+        self.header = self.slots = self.utilities = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+##
+# LinearValueModel
+# Description: A linear value function over the columns of stateFeatureMatrix. Instead of one
+# utility per state it keeps one weight per feature, so its size never grows no matter how many
+# states we see. It is trained with semi-gradient TD(lambda).
+#
+# Variables:
+#   weights - One weight per feature (numpy array)
+#   trace - The eligibility trace of each weight for the current game (numpy array)
+##
+class LinearValueModel(object):
+
+    def __init__(self):
+        self.weights = np.zeros(NUM_FEATURES)
+        self.trace = np.zeros(NUM_FEATURES)
+
+    ##
+    # score
+    # Description: Gives the value of every row of a feature matrix
+    #
+    # Parameters:
+    #   features - The feature matrix (numpy array)
+    ##
+    def score(self, features):
+        return linearScores(features, self.weights)
+
+    ##
+    # update
+    # Description: Performs one semi-gradient TD(lambda) step. The step is divided by the size of
+    # the feature vector so raw counts and distances don't need to be scaled by hand.
+    #
+    # Parameters:
+    #   features - The features of the state we were in (numpy array)
+    #   nextFeatures - The features of the state we moved to (numpy array)
+    #   reward - The reward of the state we were in
+    #   learningRate - The learning rate (alpha)
+    #   discountFact - The discount factor (gamma)
+    #   traceDecay - The eligibility trace decay (lambda)
+    ##
+    def update(self, features, nextFeatures, reward, learningRate, discountFact, traceDecay):
+        error = reward + discountFact*nextFeatures.dot(self.weights) - features.dot(self.weights)
+        # The gradient of a linear value function is just its features
+        self.trace = discountFact*traceDecay*self.trace + features
+        self.weights += learningRate*error*self.trace/(1.0 + features.dot(features))
+
+    ##
+    # batchUpdate
+    # Description: Performs one semi-gradient TD(0) step on a minibatch of transitions, each
+    # normalized like update and weighted. Terminal transitions don't bootstrap.
+    #
+    # Parameters:
+    #   features - The features of the states we were in, one row per transition (numpy array)
+    #   nextFeatures - The features of the states we moved to (numpy array)
+    #   rewards - The reward of each transition (numpy array)
+    #   terminals - Whether each transition ended the game (numpy array)
+    #   weights - How much each transition counts (numpy array)
+    #   learningRate - The learning rate (alpha)
+    #   discountFact - The discount factor (gamma)
+    #
+    # Returns: The TD error of each transition (numpy array)
+    ##
+    def batchUpdate(self, features, nextFeatures, rewards, terminals, weights, learningRate,
+                    discountFact):
+        nextValues = np.where(terminals, 0.0, self.score(nextFeatures))
+        errors = rewards + discountFact*nextValues - self.score(features)
+        steps = weights*errors/(1.0 + np.einsum('ij,ij->i', features, features))
+        self.weights += learningRate*steps.dot(features)/len(features)
+        return errors
+
+    ##
+    # resetTrace
+    # Description: Forgets the eligibility trace at the end of a game
+    ##
+    def resetTrace(self):
+        self.trace = np.zeros(NUM_FEATURES)
+
+
+##
+# ReplayBuffer
+# Description: A ring buffer of past transitions to learn from again (see AIPlayer.replayUpdate).
+# Transitions are kept in preallocated numpy arrays, one row each, so a minibatch is sampled and
+# learned from without building a Python object per transition. Once the buffer is full the
+# oldest transitions are overwritten. For prioritized sampling each transition is drawn with
+# probability proportional to its last TD error (raised to REPLAY_ALPHA), new ones at the
+# highest priority so they are sampled at least once.
+#
+# Variables:
+#   keys, nextKeys - The state keys of each transition (see Consolidation.getKey)
+#   features, nextFeatures - The feature rows of each transition (see stateFeatureMatrix)
+#   rewards - The reward of each transition
+#   terminals - Whether each transition ended the game
+#   priorities - The sampling priority of each transition
+##
+class ReplayBuffer(object):
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.keys = np.zeros((capacity, KEY_LENGTH), dtype=np.int32)
+        self.nextKeys = np.zeros((capacity, KEY_LENGTH), dtype=np.int32)
+        self.features = np.zeros((capacity, NUM_FEATURES), dtype=np.float32)
+        self.nextFeatures = np.zeros((capacity, NUM_FEATURES), dtype=np.float32)
+        self.rewards = np.zeros(capacity)
+        self.terminals = np.zeros(capacity, dtype=bool)
+        self.priorities = np.zeros(capacity)
+        self.maxPriority = 1.0
+        self.size = 0
+        self.position = 0
+
+    def __len__(self):
+        return self.size
+
+    ##
+    # add
+    # Description: Stores a transition, overwriting the oldest one if the buffer is full
+    #
+    # Parameters:
+    #   key - The key of the state we were in
+    #   nextKey - The key of the state we moved to
+    #   features - The features of the state we were in
+    #   nextFeatures - The features of the state we moved to
+    #   reward - The reward of the state we were in
+    #   terminal - Whether the game was over
+    ##
+    def add(self, key, nextKey, features, nextFeatures, reward, terminal):
+        i = self.position
+        self.keys[i] = key
+        self.nextKeys[i] = nextKey
+        self.features[i] = features
+        self.nextFeatures[i] = nextFeatures
+        self.rewards[i] = reward
+        self.terminals[i] = terminal
+        self.priorities[i] = self.maxPriority
+        self.position = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    ##
+    # sample
+    # Description: Draws a minibatch of transitions (with replacement)
+    #
+    # Parameters:
+    #   batchSize - How many transitions to draw
+    #   prioritized - Whether to draw by priority rather than uniformly
+    #
+    # Returns: [indices, weights] where weights are the importance sampling weights that make up
+    #          for drawing by priority (all ones for uniform sampling)
+    ##
+    def sample(self, batchSize, prioritized):
+        if not prioritized:
+            return np.random.randint(0, self.size, batchSize), np.ones(batchSize)
+        probabilities = self.priorities[:self.size] ** REPLAY_ALPHA
+        probabilities /= probabilities.sum()
+        indices = np.random.choice(self.size, batchSize, p=probabilities)
+        weights = (self.size * probabilities[indices]) ** -REPLAY_BETA
+        return indices, weights / weights.max()
+
+    ##
+    # updatePriorities
+    # Description: Sets the priorities of sampled transitions from their latest TD errors
+    #
+    # Parameters:
+    #   indices - The transitions (from sample)
+    #   errors - Their TD errors (numpy array)
+    ##
+    def updatePriorities(self, indices, errors):
+        priorities = np.abs(errors) + REPLAY_EPSILON
+        self.priorities[indices] = priorities
+        self.maxPriority = max(self.maxPriority, priorities.max())
+
+
+##
+# AsyncLearner
+# Description: Runs an agent's TD(lambda) steps on a background thread, so a move never waits for
+# learning. getMove queues each transition it makes (the state it was in and the description of
+# the state its move leads to) and carries on. The learner thread takes whatever transitions are
+# waiting, up to batchSize of them, and learns from them against its own overlay of utilities.
+# Only once the whole batch is learned does it publish a new snapshot, a new dictionary of every
+# utility changed this game (or a new weights array for the linear backend), by swapping a single
+# reference. A move reads whichever snapshot is published when it starts, so it sees all of a
+# batch or none of it and never waits. The utility table itself is only written by flush, which
+# waits for the queue to empty and is called when the game ends. A batch is learned on copies of
+# the traces and the linear model, which replace the agent's (along with the batch's transitions
+# joining the replay buffer) only once it is all learned. A batch that fails to learn is reported
+# and dropped whole without stopping the thread, so flush never waits on a dead learner. The
+# learner draws the utilities of new states from its own random generator, seeded from the
+# agent's thread, so a seeded run draws the same utilities whenever the learner runs.
+#
+# Variables:
+#   agent - The AIPlayer learning
+#   transitions - The queue of transitions waiting to be learned from
+#   batchSize - The most transitions learned from before publishing a snapshot
+#   published - The latest snapshot of state key -> utility changed this game. It is replaced,
+#               never changed
+#   pending - The utilities changed by the batch being learned from
+#   model - The learner's own copy of the linear value function, or None until the game's first
+#           batch
+#   errors - How many batches failed and were dropped
+#   random - The learner's random generator
+##
+class AsyncLearner(object):
+
+    def __init__(self, agent, batchSize=None):
+        self.agent = agent
+        self.random = random.Random(random.getrandbits(32))
+        self.batchSize = batchSize or ASYNC_BATCH_SIZE
+        self.transitions = queue.Queue()
+        self.published = {}
+        self.pending = {}
+        self.model = None
+        self.batches = 0
+        self.errors = 0
+        self.worker = threading.Thread(target=self.learn)
+        self.worker.daemon = True
+        self.worker.start()
+
+    ##
+    # add
+    # Description: Queues a transition to learn from and returns straight away
+    #
+    # Parameters:
+    #   currentState - The state the move was made in
+    #   key - The key of the state the move leads to
+    #   features - The features of that state
+    #   outcome - The (iWon, iLost) pair of that state
+    ##
+    def add(self, currentState, key, features, outcome):
+        self.transitions.put((currentState, key, features, outcome))
+
+    ##
+    # get, set, __contains__
+    # Description: The utilities the learner thread sees: the batch being learned from, then the
+    # published snapshot, then the agent's table. They let the batch be learned with
+    # AIPlayer.learnTransition as if it were a UtilityTable.
+    ##
+    def get(self, key, default=None):
+        utility = self.pending.get(key)
+        if utility is None:
+            utility = self.published.get(key)
+        if utility is None:
+            utility = self.agent.consolidatedState.get(key)
+        return default if utility is None else utility
+
+    def set(self, key, utility):
+        self.pending[key] = utility
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    ##
+    # learn
+    # Description: The learner thread. Learns from the queued transitions a batch at a time.
+    ##
+    def learn(self):
+        while True:
+            self.learnWaiting(self.transitions.get())
+
+    ##
+    # learnWaiting
+    # Description: Learns from a transition and the ones queued behind it, up to a batch. A batch
+    # that fails is reported and dropped, none of it is published, and learning carries on.
+    #
+    # Parameters:
+    #   transition - The first transition of the batch
+    ##
+    def learnWaiting(self, transition):
+        batch = [transition]
+        while len(batch) < self.batchSize:
+            try:
+                batch.append(self.transitions.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            self.learnBatch(batch)
+        except Exception as e:
+            self.pending = {}
+            self.errors += 1
+            print("Asynchronous learning dropped %d transitions: %r" % (len(batch), e), file=sys.stderr)
+        finally:
+            for transition in batch:
+                self.transitions.task_done()
+
+    ##
+    # learnBatch
+    # Description: Runs a TD(lambda) step for each transition of a batch, then publishes the result.
+    # Nothing the batch learns is kept unless every step succeeds.
+    #
+    # Parameters:
+    #   batch - The transitions, as queued by add
+    ##
+    def learnBatch(self, batch):
+        agent = self.agent
+        linear = agent.valueBackend == LINEAR_BACKEND
+        traces = dict(agent.traces)
+        model = None
+        if linear:
+            model = LinearValueModel()
+            if self.model is None:
+                model.weights = agent.linearModel.weights.copy()
+            else:
+                model.weights = self.model.weights.copy()
+                model.trace = self.model.trace.copy()
+        described = []
+        for currentState, nextKey, nextFeatures, nextOutcome in batch:
+            keys, features, outcomes = agent.describeStates([currentState])
+            keys = [keys[0], nextKey]
+            outcomes = [outcomes[0], nextOutcome]
+            if np is not None:
+                features = np.array([features[0], nextFeatures], dtype=float)
+            else:
+                features = [features[0], nextFeatures]
+            if not linear:
+                for key, outcome in zip(keys, outcomes):
+                    if key not in self:
+                        self.set(key, initialUtility(outcome[0], outcome[1], self.random))
+            agent.learnTransition(self, model, traces, keys, features, outcomes)
+            described.append((keys, features, outcomes))
+
+        agent.traces = traces
+        self.model = model
+        for keys, features, outcomes in described:
+            agent.rememberTransition(keys, features, outcomes)
+        if self.pending:
+            published = dict(self.published)
+            published.update(self.pending)
+            self.published = published
+            self.pending = {}
+        if linear:
+            agent.linearModel.weights = self.model.weights.copy()
+        self.batches += 1
+
+    ##
+    # flush
+    # Description: Waits until every queued transition has been learned from, then writes the
+    # game's utilities into the agent's table and starts the next game's snapshot afresh
+    ##
+    def flush(self):
+        # Should the learner thread have died, what it left behind is learned here instead
+        while not self.worker.is_alive():
+            try:
+                self.learnWaiting(self.transitions.get_nowait())
+            except queue.Empty:
+                break
+        self.transitions.join()
+        table = self.agent.consolidatedState
+        for key, utility in self.published.items():
+            table.set(key, utility)
+        self.published = {}
+        # The next game starts from the agent's weights, which may have changed between games
+        self.model = None
+
+
+##
+# EpisodeLogger
+# Description: Logs every turn an agent plays: the state its move leads to (key and features), the
+# move, the reward of that state and the utility we gave it. Turns are written into preallocated
+# columns and each game (or each EPISODE_CHUNK_ROWS turns of a long one) is handed to a
+# background thread, which saves the columns as one .npz chunk file. At most
+# EPISODE_QUEUE_CHUNKS chunks wait to be written, after that the game waits for the writer, so
+# memory stays bounded. A chunk never holds more than one game. Chunks are named
+# episodes-<run>-<sequence>.npz, so sorting the names puts each run's chunks in order. If a chunk
+# can't be written (the disk is full, the directory is gone) logging stops: the error is reported
+# once and everything after it is dropped, so the game never waits on a writer that can't write.
+#
+# Variables:
+#   directory - The directory chunks are written to
+#   failed - Whether writing a chunk has failed, after which nothing more is logged
+#   run - Tells the chunks of this logger apart from other agents' and processes'
+#   episode - The number of the game being logged
+#   columns - The columns of the chunk being filled (see EPISODE_COLUMNS)
+#   rows - How many turns the chunk being filled holds
+##
+class EpisodeLogger(object):
+
+    def __init__(self, directory, run, chunkRows=None):
+        self.directory = directory
+        self.run = run
+        self.chunkRows = chunkRows or EPISODE_CHUNK_ROWS
+        self.episode = 0
+        self.turn = 0
+        self.chunks = 0
+        self.failed = False
+        self.pending = queue.Queue(EPISODE_QUEUE_CHUNKS)
+        self.newChunk()
+        self.writer = threading.Thread(target=self.writeChunks)
+        self.writer.daemon = True
+        self.writer.start()
+        atexit.register(self.close)
+
+    ##
+    # fromEnvironment
+    # Description: Creates the logger asked for by the EPISODE_LOG_ENV environment variable
+    #
+    # Parameters:
+    #   playerId - The id of the player being logged
+    #
+    # Returns: The EpisodeLogger, or None if logging is off (or numpy is missing)
+    ##
+    @staticmethod
+    def fromEnvironment(playerId):
+        directory = os.environ.get(EPISODE_LOG_ENV)
+        if not directory or np is None:
+            return None
+        directory = os.path.abspath(directory)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        return EpisodeLogger(directory, '%d-%d-%d' % (int(time.time() * 1000), os.getpid(), playerId))
+
+    ##
+    # newChunk
+    # Description: Allocates empty columns for the next chunk
+    ##
+    def newChunk(self):
+        self.columns = dict((name, np.zeros((self.chunkRows,) + shape, dtype=dtype))
+                            for name, dtype, shape in EPISODE_COLUMNS)
+        self.rows = 0
+
+    ##
+    # record
+    # Description: Logs one turn of the current game
+    #
+    # Parameters:
+    #   key - The key of the state our move leads to
+    #   features - The features of that state
+    #   move - The move we chose
+    #   reward - The reward of that state
+    #   utility - The utility we gave that state
+    ##
+    def record(self, key, features, move, reward, utility):
+        if self.failed:
+            return
+        columns = self.columns
+        i = self.rows
+        columns['game'][i] = self.episode
+        columns['turn'][i] = self.turn
+        columns['key'][i] = key
+        columns['features'][i] = features
+        columns['moveType'][i] = move.moveType
+        if move.coordList:
+            columns['start'][i] = coordsCell(move.coordList[0])
+            columns['end'][i] = coordsCell(move.coordList[-1])
+        else:
+            columns['start'][i] = columns['end'][i] = -1
+        columns['reward'][i] = reward
+        columns['utility'][i] = utility
+        self.turn += 1
+        self.rows += 1
+        if self.rows == self.chunkRows:
+            self.flush()
+
+    ##
+    # endEpisode
+    # Description: Hands the rest of the current game to the writer and starts the next one
+    ##
+    def endEpisode(self):
+        self.flush()
+        self.episode += 1
+        self.turn = 0
+
+    ##
+    # flush
+    # Description: Hands the chunk being filled to the writer, waiting if too many are pending
+    ##
+    def flush(self):
+        if not self.rows or self.failed:
+            return
+        self.pending.put(dict((name, column[:self.rows]) for name, column in self.columns.items()))
+        self.newChunk()
+
+    ##
+    # writeChunks
+    # Description: The writer thread. Saves pending chunks until it is handed None. After a chunk
+    # fails to save the rest are dropped, so the game is never left waiting to hand one over.
+    ##
+    def writeChunks(self):
+        while True:
+            chunk = self.pending.get()
+            if chunk is None:
+                return
+            if self.failed:
+                continue
+            path = os.path.join(self.directory, 'episodes-%s-%06d.npz' % (self.run, self.chunks))
+            self.chunks += 1
+            try:
+                with open(path + '.tmp', 'wb') as f:
+                    np.savez(f, **chunk)
+                replaceFile(path + '.tmp', path)
+            except Exception as e:
+                self.failed = True
+                print("Episode logging to %s stopped: %s" % (self.directory, e), file=sys.stderr)
+
+    ##
+    # close
+    # Description: Writes out everything logged so far and stops the writer
+    ##
+    def close(self):
+        if self.writer is None:
+            return
+        self.flush()
+        self.pending.put(None)
+        self.writer.join()
+        self.writer = None
+
+
+##
+# readEpisodes
+# Description: Streams the games in a directory of episode logs (see EpisodeLogger) back one at a
+# time. Chunk files are only read when the generator reaches them.
+#
+# Parameters:
+#   directory - The directory the chunks were written to
+#
+# Returns: A generator of games, each a dictionary of numpy columns (see EPISODE_COLUMNS) with one
+#          row per turn
+##
+def readEpisodes(directory):
+    current = None
+    pieces = []
+    for name in sorted(os.listdir(directory)):
+        if not (name.startswith('episodes-') and name.endswith('.npz')):
+            continue
+        chunk = np.load(os.path.join(directory, name))
+        columns = dict((column, chunk[column]) for column in chunk.files)
+        chunk.close()
+        if not len(columns['game']):
+            continue
+        # The chunks of a game long enough to span several are consecutive
+        game = (name.rsplit('-', 1)[0], int(columns['game'][0]))
+        if game != current and pieces:
+            yield joinColumns(pieces)
+            pieces = []
+        current = game
+        pieces.append(columns)
+    if pieces:
+        yield joinColumns(pieces)
+
+
+##
+# joinColumns
+# Description: Joins chunks of columns end to end
+#
+# Parameters:
+#   pieces - The dictionaries of numpy columns to join
+##
+def joinColumns(pieces):
+    if len(pieces) == 1:
+        return pieces[0]
+    return dict((name, np.concatenate([piece[name] for piece in pieces])) for name in pieces[0])
+
+
+##
+# Consolidation
+# Description: This class contains some elements of an Antics state. It contains what we have
+# deemed the most important parts of the state to use to generate an utility. It is a small fixed
+# size record: distances are kept as a few aggregates rather than one per ant. Everything in it,
+# including whether the game has been won or lost, is found in a single walk over the state.
+# The state is always described from playerId's side, whoever's turn it is. The board is the same
+# for both players, so a situation gets the same key whichever player we are and whoever is to move.
+#
+#
+# Variables:
+#   currentState - The current state to be consolidated
+#   playerId - The id of the player the state is described for
+##
+class Consolidation(object):
+    # Utility is only set on Consolidations unpickled from old pickle files
+    __slots__ = ('Utility', 'iWon', 'iLost', 'myNumFood', 'enemyNumFood', 'myNonWorkers', 'enemyNonWorkers',
+                 'myNumAnts', 'meanDistToTunnel', 'maxDistToTunnel',
+                 'enemyNumSoldiers', 'meanEnemyDistToQueen', 'minEnemyDistToQueen',
+                 'myAntCounts', 'enemyAntCounts')
+
+    # __init__
+    # Description: Creates a new Consolidation
+    #
+    # Parameters:
+    #   currentState - The current state to be consolidated
+    #   playerId - The id of the player the state is described for
+    ##
+    def __init__(self, currentState, playerId):
+        for inv in currentState.inventories:
+            if inv.player == playerId:
+                inventory = inv
+            elif inv.player != NEUTRAL:
+                enemyInv = inv
+
+        # Find our tunnel and both anthills
+        myTunnel = None
+        myAnthill = None
+        for constr in inventory.constrs:
+            if constr.type == TUNNEL and myTunnel is None:
+                myTunnel = constr
+            elif constr.type == ANTHILL:
+                myAnthill = constr
+        enemyAnthill = None
+        for constr in enemyInv.constrs:
+            if constr.type == ANTHILL:
+                enemyAnthill = constr
+
+        # Count our ants by type and find how far each of them is from our tunnel
+        myCounts = dict.fromkeys(FEATURE_ANT_TYPES, 0)
+        myQueen = None
+        totalDistToTunnel = 0.0
+        maxDistToTunnel = 0.0
+        tunnelCoords = myTunnel.coords
+        for ant in inventory.ants:
+            myCounts[ant.type] += 1
+            if ant.type == QUEEN:
+                myQueen = ant
+            value = sqrt(abs(abs(tunnelCoords[0] - ant.coords[0]) - abs(tunnelCoords[1] - ant.coords[1])))
+            totalDistToTunnel += value
+            maxDistToTunnel = max(maxDistToTunnel, value)
+
+        # Count the enemy ants by type and find how far each enemy soldier is from our queen
+        enemyCounts = dict.fromkeys(FEATURE_ANT_TYPES, 0)
+        enemyHasQueen = False
+        totalEnemyDistToQueen = 0.0
+        minEnemyDistToQueen = None
+        for ant in enemyInv.ants:
+            enemyCounts[ant.type] += 1
+            if ant.type == QUEEN:
+                enemyHasQueen = True
+            elif ant.type == SOLDIER and myQueen is not None:
+                value = sqrt(abs(abs(ant.coords[0] - myQueen.coords[0]) - abs(ant.coords[1] - myQueen.coords[1])))
+                totalEnemyDistToQueen += value
+                minEnemyDistToQueen = value if minEnemyDistToQueen is None else min(minEnemyDistToQueen, value)
+
+        # Find out whether either side has won, the same way AIPlayer.hasWon does
+        playing = currentState.phase == PLAY_PHASE
+        self.iWon = playing and wonGame(inventory.foodCount, enemyInv.foodCount, len(enemyInv.ants),
+                                        enemyHasQueen, enemyAnthill)
+        self.iLost = playing and wonGame(enemyInv.foodCount, inventory.foodCount, len(inventory.ants),
+                                         myQueen is not None, myAnthill)
+
+        ##
+        # Setting the class variables using the information from the state gathered above
+        #
+        self.myNumFood = inventory.foodCount
+        self.enemyNumFood = enemyInv.foodCount
+        self.myNonWorkers = myCounts[WORKER]
+        self.enemyNonWorkers = enemyCounts[WORKER]
+        self.myAntCounts = tuple(myCounts[antType] for antType in FEATURE_ANT_TYPES)
+        self.enemyAntCounts = tuple(enemyCounts[antType] for antType in FEATURE_ANT_TYPES)
+        self.myNumAnts = len(inventory.ants)
+        self.meanDistToTunnel = totalDistToTunnel / self.myNumAnts if self.myNumAnts else 0.0
+        self.maxDistToTunnel = maxDistToTunnel
+        self.enemyNumSoldiers = enemyCounts[SOLDIER] if myQueen is not None else 0
+        self.meanEnemyDistToQueen = (totalEnemyDistToQueen / self.enemyNumSoldiers
+                                     if self.enemyNumSoldiers else 0.0)
+        self.minEnemyDistToQueen = minEnemyDistToQueen if minEnemyDistToQueen is not None else 0.0
+
+    ##
+    # getFeatures
+    # Description: Lists the consolidated fields as a row of the feature matrix (see FEATURE_NAMES)
+    ##
+    def getFeatures(self):
+        return ([self.myNumFood, self.enemyNumFood] + list(self.myAntCounts) + list(self.enemyAntCounts) +
+                [self.meanDistToTunnel, self.maxDistToTunnel, self.meanEnemyDistToQueen, self.minEnemyDistToQueen,
+                 1.0 if self.iWon else 0.0, 1.0 if self.iLost else 0.0])
+
+    ##
+    # setDistances
+    # Description: Sets the distance aggregates from the distance of each of our ants to our tunnel
+    # and of each enemy soldier to our queen
+    #
+    # Parameters:
+    #   distToTunnel - The list of our ants' distances to our tunnel
+    #   enemyDistToQueen - The list of enemy soldiers' distances to our queen
+    ##
+    def setDistances(self, distToTunnel, enemyDistToQueen):
+        self.myNumAnts = len(distToTunnel)
+        self.meanDistToTunnel = sum(distToTunnel) / float(len(distToTunnel)) if distToTunnel else 0.0
+        self.maxDistToTunnel = max(distToTunnel) if distToTunnel else 0.0
+        self.enemyNumSoldiers = len(enemyDistToQueen)
+        self.meanEnemyDistToQueen = (sum(enemyDistToQueen) / float(len(enemyDistToQueen))
+                                     if enemyDistToQueen else 0.0)
+        self.minEnemyDistToQueen = min(enemyDistToQueen) if enemyDistToQueen else 0.0
+
+    ##
+    # getKey
+    # Description: Builds a compact, hashable key out of the consolidated fields. Two consolidations
+    # of the same situation always produce the same key, so it can be used to index the utility table.
+    #
+    # Returns: A tuple identifying the consolidated state (see stateKey)
+    ##
+    def getKey(self):
+        return stateKey(self.iWon, self.iLost, self.myNumFood, self.enemyNumFood,
+                        self.myNonWorkers, self.enemyNonWorkers,
+                        self.myNumAnts, self.meanDistToTunnel, self.maxDistToTunnel,
+                        self.enemyNumSoldiers, self.meanEnemyDistToQueen, self.minEnemyDistToQueen)
+
+    def __getstate__(self):
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+    ##
+    # __setstate__
+    # Description: Restores a pickled Consolidation. Consolidations pickled before they became fixed
+    # size records kept a list of distances per ant, those lists are turned into the aggregates.
+    #
+    # Parameters:
+    #   state - The pickled dictionary of fields
+    ##
+    def __setstate__(self, state):
+        if 'distToTunnel' in state:
+            self.setDistances(state['distToTunnel'], state['enemyDistToQueen'])
+            state = dict(state, iWon=state.get('iWon', False), iLost=state.get('iLost', False))
+        for name in self.__slots__:
+            if name in state:
+                setattr(self, name, state[name])
+
+
+##
+# moveGain
+# Description: A cheap guess at how good moving an ant is, without generating the state it leads
+# to: how many steps closer it gets to where it wants to be. Workers head for food, or home to our
+# anthill or tunnel when they are carrying food. Fighting ants head for the enemy's ants. The
+# queen has nowhere to be.
+#
+# Parameters:
+#   ant - The ant being moved (or None)
+#   start - Where the ant is
+#   end - Where the move takes it
+#   homes - The coordinates of our anthill and tunnel
+#   foods - The coordinates of the food on the board
+#   enemies - The coordinates of the enemy's ants
+##
+def moveGain(ant, start, end, homes, foods, enemies):
+    if ant is None or ant.type == QUEEN:
+        return 0
+    if ant.type == WORKER:
+        targets = homes if ant.carrying else foods
+    else:
+        targets = enemies
+    if not targets:
+        return 0
+    return (min(approxDist(start, target) for target in targets) -
+            min(approxDist(end, target) for target in targets))
+
+
+##
+# wonGame
+# Description: Decides whether a player has won a game that is in its play phase
+#
+# Parameters:
+#   foodCount - The player's food
+#   enemyFoodCount - The opponent's food
+#   enemyNumAnts - How many ants the opponent has
+#   enemyHasQueen - Whether the opponent still has a queen
+#   enemyAnthill - The opponent's anthill
+##
+def wonGame(foodCount, enemyFoodCount, enemyNumAnts, enemyHasQueen, enemyAnthill):
+    return (not enemyHasQueen or enemyAnthill.captureHealth <= 0 or foodCount >= FOOD_GOAL or
+            (enemyFoodCount == 0 and enemyNumAnts == 1))
+
+
+##
+# gameOutcome
+# Description: Finds out whether a player has won or lost a game, looking at each side only once
+#
+# Parameters:
+#   currentState - The state of the game
+#   playerId - The id of the player
+#
+# Returns: [iWon, iLost]
+##
+def gameOutcome(currentState, playerId):
+    if currentState.phase != PLAY_PHASE:
+        return False, False
+    inventory = currentState.inventories[playerId]
+    enemyInv = currentState.inventories[(playerId + 1) % 2]
+    hasQueen = inventory.getQueen() is not None
+    enemyHasQueen = enemyInv.getQueen() is not None
+    return (wonGame(inventory.foodCount, enemyInv.foodCount, len(enemyInv.ants), enemyHasQueen,
+                    enemyInv.getAnthill()),
+            wonGame(enemyInv.foodCount, inventory.foodCount, len(inventory.ants), hasQueen,
+                    inventory.getAnthill()))
+
+
+##
+# stateKey
+# Description: Builds the utility table key of a consolidated state. It is a flat tuple of small
+# ints, with distances bucketed to half steps.
+#
+# Parameters:
+#   The fields of a Consolidation, in the order they are declared
+##
+def stateKey(iWon, iLost, myNumFood, enemyNumFood, myNonWorkers, enemyNonWorkers,
+             myNumAnts, meanDistToTunnel, maxDistToTunnel,
+             enemyNumSoldiers, meanEnemyDistToQueen, minEnemyDistToQueen):
+    return (int(iWon), int(iLost), myNumFood, enemyNumFood, myNonWorkers, enemyNonWorkers,
+            myNumAnts, int(2*meanDistToTunnel), int(2*maxDistToTunnel),
+            enemyNumSoldiers, int(2*meanEnemyDistToQueen), int(2*minEnemyDistToQueen))
+
+# How many fields a state key has
+KEY_LENGTH = 12
+
+
+##
+# migrateStateKey
+# Description: Converts a key from before Consolidation kept fixed size distance aggregates, which
+# held a tuple of whole-number distances per ant, into the current format. Current keys are
+# returned as they are.
+#
+# Parameters:
+#   key - The key to convert
+##
+def migrateStateKey(key):
+    if len(key) != 8:
+        return key
+    iWon, iLost, myNumFood, enemyNumFood, myNonWorkers, enemyNonWorkers, distToTunnel, enemyDistToQueen = key
+    record = Consolidation.__new__(Consolidation)
+    record.setDistances(distToTunnel, enemyDistToQueen)
+    return stateKey(iWon, iLost, myNumFood, enemyNumFood, myNonWorkers, enemyNonWorkers,
+                    record.myNumAnts, record.meanDistToTunnel, record.maxDistToTunnel,
+                    record.enemyNumSoldiers, record.meanEnemyDistToQueen, record.minEnemyDistToQueen)
+
+
+##
+# initialUtility
+# Description: The utility we give a state the first time we see it
+#
+# Parameters:
+#   iWon - A boolean variable telling us if we have won
+#   iLost - A boolean variable telling us if we have lost
+#   rng - The random generator to draw the utility of a state that isn't over from
+##
+def initialUtility(iWon, iLost, rng=random):
+    # If I have won this is a good utility, so set it to be a large number
+    if iWon:
+        return 1000
+    # If I have lost this is a bad utility, so set it to be a large negative number
+    elif iLost:
+        return -1000
+    # Otherwise set my utility to a random number
+    else:
+        return rng.randint(0,100)
+
+
+##
+# expectedUtility
+# Description: What initialUtility gives a state on average. A frozen agent scores states it has
+# never seen with this, so its play doesn't depend on random draws.
+#
+# Parameters:
+#   iWon - A boolean variable telling us if we have won
+#   iLost - A boolean variable telling us if we have lost
+##
+def expectedUtility(iWon, iLost):
+    if iWon:
+        return 1000
+    elif iLost:
+        return -1000
+    return 50
+
+
+##
+# The files our learned utilities are kept in. UTILITY_FILE is the format read and written by
+# UtilityTable, UTILITY_LOG_FILE holds the changes made since it was last written and PICKLE_FILE
+# is the older pickled format it can be converted from.
+##
+UTILITY_FILE = 'santilla18_kister19.utl'
+PICKLE_FILE = 'santilla18_kister19.p'
+WEIGHTS_FILE = 'santilla18_kister19_weights.npy'
+UTILITY_FILE_HEADER = '<4sIQ'
+UTILITY_FILE_MAGIC = b'SKUT'
+UTILITY_FILE_VERSION = 2
+UTILITY_LOG_FILE = 'santilla18_kister19.log'
+# The first word of a SharedUtilities segment ('SKSM1' as a little endian number) and the fraction
+# of its slots it fills at most
+SHARED_TABLE_MAGIC = 0x314d534b53
+SHARED_TABLE_LOAD = 0.7
+# Set this environment variable to keep our learned files somewhere other than the Antics directory
+DATA_DIR_ENV = 'SANTILLA18_KISTER19_DATA'
+# Set this environment variable to the name of a SharedUtilities (see serveTable) to have agents
+# read their utilities from it instead of mapping the utility file each
+SHARED_TABLE_ENV = 'SANTILLA18_KISTER19_SHARED'
+UTILITY_LOG_HEADER = '<4sI'
+UTILITY_LOG_MAGIC = b'SKL2'
+UTILITY_LOG_RECORD = [('key', '<u8'), ('utility', '<f4')]
+# The utility log is compacted into the utility file once it is bigger than this fraction of the
+# file (and at least COMPACT_MIN_LOG_BYTES), so replaying it at startup stays cheap
+COMPACT_LOG_FRACTION = 0.25
+COMPACT_MIN_LOG_BYTES = 1 << 16
+
+
+##
+# defaultDataDir
+# Description: The directory our learned files are kept in unless an AIPlayer is given another:
+# the one named by DATA_DIR_ENV, or else the Antics directory this file's AI directory sits in
+##
+def defaultDataDir():
+    return os.environ.get(DATA_DIR_ENV) or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+##
+# stateSignature
+# Description: Builds a hashable signature of everything in a game state that the legal moves and
+# successors depend on. It is much cheaper to build than copying the state.
+#
+# Parameters:
+#   currentState - The state to sign
+##
+def stateSignature(currentState):
+    inventories = []
+    for inv in currentState.inventories:
+        inventories.append((inv.foodCount,
+                            tuple((ant.coords, ant.type, ant.player, ant.hasMoved, ant.carrying, ant.health)
+                                  for ant in inv.ants),
+                            tuple((constr.coords, constr.type, getattr(constr, 'captureHealth', None))
+                                  for constr in inv.constrs)))
+    return (currentState.whoseTurn, currentState.phase, tuple(inventories))
+
+
+##
+# moveSignature
+# Description: Builds a hashable signature of a move
+#
+# Parameters:
+#   move - The move to sign
+##
+def moveSignature(move):
+    coords = tuple(move.coordList) if move.coordList is not None else None
+    return (move.moveType, coords, move.buildType)
+
+
+##
+# stateHash
+# Description: Hashes a state key down to a 64 bit number that is the same in every process and
+# Python version, so it can be stored in a utility file
+#
+# Parameters:
+#   key - The state key (see Consolidation.getKey)
+##
+def stateHash(key):
+    return struct.unpack('<Q', hashlib.md5(repr(key).encode('ascii')).digest()[:8])[0]
+
+
+##
+# replaceFile
+# Description: Moves a file over another one, replacing it in a single step where the OS allows it
+#
+# Parameters:
+#   src - The file to move
+#   dst - The file to replace
+##
+def replaceFile(src, dst):
+    if hasattr(os, 'replace'):
+        os.replace(src, dst)
+    else:
+        if os.name == 'nt' and os.path.exists(dst):
+            os.remove(dst)
+        os.rename(src, dst)
+
+
+##
+# readPickleFile
+# Description: Reads a pickled utility table. Files holding a key -> utility dictionary and older
+# files holding a list of Consolidation objects are both understood, and keys in older formats
+# are migrated (see migrateStateKey).
+#
+# Parameters:
+#   path - The pickle file to read
+#
+# Returns: The UtilityTable read from the file
+##
+def readPickleFile(path):
+    f = open(path, 'rb')
+    data = pickle.load(f)
+    f.close()
+    table = UtilityTable()
+    if isinstance(data, dict):
+        for key, utility in data.items():
+            table.set(migrateStateKey(key), utility)
+    else:
+        for state in data:
+            table.set(state.getKey(), state.Utility)
+    return table
+
+
+##
+# convertPickleFile
+# Description: Converts a pickled utility table into a utility file
+#
+# Parameters:
+#   picklePath - The pickle file to read
+#   utilityPath - The utility file to write
+##
+def convertPickleFile(picklePath, utilityPath):
+    readPickleFile(picklePath).save(utilityPath)
+
+
+##
+# The value function backends an AIPlayer can pick moves and learn with
+##
+TABLE_BACKEND = 'table'
+LINEAR_BACKEND = 'linear'
+
+# The ways UtilityTable.trim can pick the states to forget: the least recently visited, the least
+# often visited, or those whose utility has been learned the fewest times
+EVICT_LEAST_RECENT = 'recent'
+EVICT_FEWEST_VISITS = 'visits'
+EVICT_LEAST_CONFIDENT = 'confidence'
+EVICTION_POLICIES = (EVICT_LEAST_RECENT, EVICT_FEWEST_VISITS, EVICT_LEAST_CONFIDENT)
+# The fraction of its capacity a trimmed table is left below it
+EVICTION_SLACK = 0.1
+
+# How many transitions a training agent's ReplayBuffer holds, how strongly prioritized replay
+# favours large TD errors (alpha), how much of the resulting bias is undone (beta) and the
+# priority every transition keeps however small its error
+REPLAY_CAPACITY = 50000
+REPLAY_ALPHA = 0.6
+REPLAY_BETA = 0.4
+REPLAY_EPSILON = 0.01
+
+# How many moves getMove describes between deadline checks when working alone, and how many chunks
+# each worker process is given when working in parallel
+SERIAL_CHUNK_MOVES = 8
+PARALLEL_CHUNKS_PER_WORKER = 2
+
+# The most transitions an AsyncLearner learns from before publishing a new snapshot
+ASYNC_BATCH_SIZE = 32
+
+# Set this environment variable to a directory to have every agent write its per turn timings there
+PROFILE_ENV = 'SANTILLA18_KISTER19_PROFILE'
+
+
+##
+# Columns of the feature matrix built by stateFeatureMatrix. All of them are described from the
+# point of view of the player we are learning for (see Consolidation).
+##
+FEATURE_ANT_TYPES = (QUEEN, WORKER, DRONE, SOLDIER, R_SOLDIER)
+FEATURE_NAMES = (['myNumFood', 'enemyNumFood'] +
+                 ['myAnts%d' % antType for antType in FEATURE_ANT_TYPES] +
+                 ['enemyAnts%d' % antType for antType in FEATURE_ANT_TYPES] +
+                 ['meanDistToTunnel', 'maxDistToTunnel', 'meanEnemyDistToQueen', 'minEnemyDistToQueen',
+                  'iWon', 'iLost'])
+NUM_FEATURES = len(FEATURE_NAMES)
+
+# Set this environment variable to a directory to have every agent log the games it plays there
+EPISODE_LOG_ENV = 'SANTILLA18_KISTER19_EPISODES'
+# The most turns an episode log chunk holds, and how many chunks may wait to be written
+EPISODE_CHUNK_ROWS = 4096
+EPISODE_QUEUE_CHUNKS = 4
+# The columns of an episode log: (name, numpy dtype, shape of each row)
+EPISODE_COLUMNS = [('game', '<i8', ()), ('turn', '<i4', ()), ('key', '<i4', (KEY_LENGTH,)),
+                   ('features', '<f4', (NUM_FEATURES,)), ('moveType', '<i1', ()), ('start', '<i2', ()),
+                   ('end', '<i2', ()), ('reward', '<f4', ()), ('utility', '<f4', ())]
+
+
+##
+# stateFeatureMatrix
+# Description: Consolidates a list of states and describes them as one feature matrix with a row
+# per state (columns are given by FEATURE_NAMES), along with the utility table key and outcome of
+# every state.
+#
+# Parameters:
+#   states - The list of states to describe
+#   playerId - The id of the player we are learning for, whose side the states are described from
+#
+# Returns: [keys, features, outcomes] where features is a numpy array if numpy is available,
+#          otherwise a list of lists, and outcomes holds an (iWon, iLost) pair for each state
+##
+def stateFeatureMatrix(states, playerId):
+    keys = []
+    rows = []
+    outcomes = []
+    for currentState in states:
+        record = Consolidation(currentState, playerId)
+        keys.append(record.getKey())
+        rows.append(record.getFeatures())
+        outcomes.append((record.iWon, record.iLost))
+
+    if np is not None:
+        return keys, np.array(rows, dtype=float).reshape(len(rows), NUM_FEATURES), outcomes
+    return keys, rows, outcomes
+
+
+##
+# expandMoves
+# Description: Generates and describes the successors of a state for a list of moves. This is the
+# work AIPlayer.expandParallel hands to its worker processes.
+#
+# Parameters:
+#   task - A tuple of (currentState, moves, playerId)
+#
+# Returns: [keys, features, outcomes] as returned by stateFeatureMatrix
+##
+def expandMoves(task):
+    currentState, moves, playerId = task
+    return stateFeatureMatrix([getNextState(currentState, move) for move in moves], playerId)
+
+
+##
+# linearScores
+# Description: Scores every row of a feature matrix against a weight vector in a single
+# vectorized pass
+#
+# Parameters:
+#   features - The feature matrix from stateFeatureMatrix (numpy array)
+#   weights - One weight per feature column (numpy array)
+#
+# Returns: The score of each row (numpy array)
+##
+def linearScores(features, weights):
+    return features.dot(weights)
+
+
+##
+# makeAgent
+# Description: Creates an AIPlayer for headless games. Other agents may change directory while
+# they are created, so the working directory is put back afterwards.
+#
+# Parameters:
+#   playerId - The id to give the player
+#   moduleName - The module to take the AIPlayer class from, or None for this one
+##
+def makeAgent(playerId, moduleName=None):
+    if moduleName is None:
+        return AIPlayer(playerId)
+    cwd = os.getcwd()
+    try:
+        return __import__(moduleName).AIPlayer(playerId)
+    finally:
+        os.chdir(cwd)
+
+
+##
+# applyMove
+# Description: Gives the state a move leads to in a headless game. Ending the turn hands the
+# game to the other player.
+#
+# Parameters:
+#   currentState - The state the move is made in
+#   move - The move to make
+##
+def applyMove(currentState, move):
+    nextState = getNextState(currentState, move)
+    if move.moveType == END:
+        nextState.whoseTurn = (currentState.whoseTurn + 1) % 2
+        for ant in nextState.inventories[nextState.whoseTurn].ants:
+            ant.hasMoved = False
+    return nextState
+
+
+##
+# playGame
+# Description: Plays one game without the Antics engine, starting from GameState.getBasicState().
+# Learning agents run a TD step after each of their own moves, or queue one in getMove if they
+# learn asynchronously.
+#
+# Parameters:
+#   agents - The player for each side, indexed by player id
+#   learning - Which of the agents should learn, indexed by player id
+#   maxTurns - Moves after which the game is called a draw
+#   moveTimes - If given, a list per player id the seconds each getMove took are appended to
+#
+# Returns: [winner, updates] where winner is a player id or None for a draw and updates is how
+#          many TD steps were run
+##
+def playGame(agents, learning, maxTurns, moveTimes=None):
+    currentState = GameState.getBasicState()
+    updates = 0
+    for turn in range(0, maxTurns):
+        iWon, iLost = gameOutcome(currentState, PLAYER_ONE)
+        if iWon:
+            return PLAYER_ONE, updates
+        if iLost:
+            return PLAYER_TWO, updates
+        agent = agents[currentState.whoseTurn]
+        started = default_timer()
+        move = agent.getMove(currentState)
+        if moveTimes is not None:
+            moveTimes[currentState.whoseTurn].append(default_timer() - started)
+        nextState = applyMove(currentState, move)
+        if learning[currentState.whoseTurn]:
+            if not agent.asyncLearning:
+                agent.tdLearning(currentState, nextState)
+            updates += 1
+        currentState = nextState
+    return None, updates
+
+
+##
+# trainWorker
+# Description: Plays a batch of training games in a worker process. The agents start from the
+# learner's table, either the utility file the learner wrote for this round (mapped, so all workers
+# share its pages) or the learner's shared memory table, and the learner's weights, and report back
+# what they changed.
+#
+# Parameters:
+#   task - A tuple of (seed, games, backend, utilityPath, weights, opponent, maxTurns,
+#          replayBatches, prioritizedReplay, sharedName, asyncLearning). opponent is the module
+#          name of the AIPlayer to play against, or None for self play. replayBatches is how many
+#          replay minibatches each learning agent runs after a game, or 0 for no replay. sharedName
+#          is the name of the learner's SharedUtilities, or None to use the utility file.
+#          asyncLearning is whether the agents learn on a background thread (see AsyncLearner).
+#
+# Returns: [tableChanges, weightChanges, games, updates, wins] where tableChanges holds a list of
+#          (startUtility, endUtility) pairs for each state key an agent changed (startUtility is
+#          None for new states) and weightChanges the change in weights of each learning agent
+##
+def trainWorker(task):
+    (seed, games, backend, utilityPath, weights, opponent, maxTurns, replayBatches,
+     prioritizedReplay, sharedName, asyncLearning) = task
+    random.seed(seed)
+    if np is not None:
+        np.random.seed(seed % (2**32))
+
+    base = None
+    if sharedName is not None:
+        base = SharedUtilities.attach(sharedName)
+    elif utilityPath is not None and os.path.exists(utilityPath):
+        base = MappedUtilities(utilityPath)
+    agents = []
+    learning = []
+    for playerId in (PLAYER_ONE, PLAYER_TWO):
+        if playerId == PLAYER_TWO and opponent is not None:
+            agents.append(makeAgent(playerId, opponent))
+            learning.append(False)
+            continue
+        agent = makeAgent(playerId)
+        agent.valueBackend = backend
+        agent.consolidatedState = UtilityTable(base)
+        # Our table comes from the learner, not our files
+        agent.loaded = True
+        agent.asyncLearning = asyncLearning
+        if replayBatches:
+            agent.replay = ReplayBuffer(REPLAY_CAPACITY)
+            agent.replayBatches = replayBatches
+            agent.prioritizedReplay = prioritizedReplay
+        if weights is not None:
+            agent.linearModel.weights = weights.copy()
+        agents.append(agent)
+        learning.append(True)
+
+    updates = 0
+    wins = 0
+    for game in range(0, games):
+        winner, gameUpdates = playGame(agents, learning, maxTurns)
+        updates += gameUpdates
+        wins += 1 if winner == PLAYER_ONE else 0
+        for agent, learns in zip(agents, learning):
+            if learns:
+                agent.endGame()
+
+    tableChanges = {}
+    weightChanges = []
+    for agent, learns in zip(agents, learning):
+        if not learns:
+            continue
+        # Pool workers exit without running atexit, so the episode log is finished here
+        if agent.episodeLog is not None:
+            agent.episodeLog.close()
+        table = agent.consolidatedState
+        for key, utility in table.utilities.items():
+            start = table.base.get(stateHash(key)) if table.base is not None else None
+            tableChanges.setdefault(key, []).append((start, utility))
+        if weights is not None:
+            weightChanges.append(agent.linearModel.weights - weights)
+    if sharedName is not None:
+        base.close()
+    return tableChanges, weightChanges, games, updates, wins
+
+
+##
+# mergeChanges
+# Description: Folds what the workers learned into the learner. Each state (and the weights) moves
+# by the average change the workers made to it. States new to the learner take the average utility
+# the workers gave them.
+#
+# Parameters:
+#   learner - The AIPlayer holding the shared table and weights
+#   results - The trainWorker results of this round
+#
+# Returns: The keys of the states that changed
+##
+def mergeChanges(learner, results):
+    table = learner.consolidatedState
+    changes = {}
+    for tableChanges, weightChanges, games, updates, wins in results:
+        for key, pairs in tableChanges.items():
+            changes.setdefault(key, []).extend(pairs)
+    for key, pairs in changes.items():
+        current = table.get(key)
+        if current is None:
+            table.set(key, sum(end for start, end in pairs) / float(len(pairs)))
+        else:
+            table.set(key, current + sum(end - (current if start is None else start)
+                                         for start, end in pairs) / float(len(pairs)))
+
+    weightChanges = [change for result in results for change in result[1]]
+    if weightChanges:
+        learner.linearModel.weights += sum(weightChanges) / float(len(weightChanges))
+    return list(changes.keys())
+
+
+##
+# train
+# Description: Headless training. Runs games on a pool of worker processes in rounds. Before each
+# round the learner writes out its utility file, and after it merges what the workers learned and
+# reports how fast training is going. Given sharedStates the learner instead keeps its table in a
+# SharedUtilities the workers read from. Each round it writes the states it merged there and
+# appends them to its utility log rather than rewriting the file. When the shared table fills up
+# it is rebuilt, bigger, from the learner's table. If that fails training stops early, keeping
+# what was learned.
+#
+# Parameters:
+#   games - How many games to play in total
+#   workers - How many worker processes to use
+#   gamesPerTask - How many games a worker plays before reporting back
+#   backend - TABLE_BACKEND or LINEAR_BACKEND
+#   opponent - The module name of the AIPlayer to train against, or None for self play
+#   maxTurns - Moves after which a game is called a draw
+#   seed - The seed the games' seeds are drawn from
+#   replayBatches - How many replay minibatches each agent learns from after a game (0 for none)
+#   prioritizedReplay - Whether replay favours transitions with large TD errors
+#   tableCapacity - The most states the learner's table keeps, or None for no limit
+#   evictionPolicy - Which states the learner forgets first when its table is full
+#   sharedStates - How many states the shared memory table holds, or None to share the file
+#   asyncLearning - Whether the agents learn on a background thread instead of in their turns
+##
+def train(games, workers, gamesPerTask, backend, opponent, maxTurns, seed, replayBatches=0,
+          prioritizedReplay=True, tableCapacity=None, evictionPolicy=EVICT_LEAST_RECENT,
+          sharedStates=None, asyncLearning=False):
+    if np is None:
+        raise ImportError("Training needs numpy to share the utility file with the workers")
+    learner = AIPlayer(PLAYER_ONE)
+    learner.valueBackend = backend
+    learner.tableCapacity = tableCapacity
+    learner.evictionPolicy = evictionPolicy
+    learner.loadTable()
+    utilityPath = learner.dataPath(UTILITY_FILE)
+    logPath = learner.dataPath(UTILITY_LOG_FILE)
+    table = learner.consolidatedState
+    shared = None
+    if sharedStates is not None:
+        shared = SharedUtilities.fromTable(table, sharedStates)
+    seeds = random.Random(seed)
+    pool = multiprocessing.Pool(workers)
+    start = time.time()
+    played = 0
+    updates = 0
+    wins = 0
+    try:
+        while played < games:
+            if shared is None:
+                learner.writeFile()
+            weights = learner.linearModel.weights.copy() if backend == LINEAR_BACKEND else None
+            tasks = []
+            planned = played
+            for worker in range(0, workers):
+                taskGames = min(gamesPerTask, games - planned)
+                if taskGames <= 0:
+                    break
+                tasks.append((seeds.randint(0, 2**62), taskGames, backend, utilityPath, weights,
+                              opponent, maxTurns, replayBatches, prioritizedReplay,
+                              shared.name if shared is not None else None, asyncLearning))
+                planned += taskGames
+
+            results = pool.map(trainWorker, tasks)
+            changed = mergeChanges(learner, results)
+            for result in results:
+                played += result[2]
+                updates += result[3]
+                wins += result[4]
+            if shared is not None:
+                try:
+                    shared = shareChanges(shared, table, changed, sharedStates)
+                except (MemoryError, OSError) as e:
+                    print("Stopping early, the shared table can't grow: %s" % e)
+                    break
+                finally:
+                    # Logged before trimming, so nothing merged this round is lost with the states
+                    # trim forgets
+                    learner.checkpoint()
+                    table.trim(logPath)
+            else:
+                table.trim(logPath)
+            elapsed = time.time() - start
+            print("%d/%d games  %.1f games/sec  %.1f updates/sec  win rate %.3f  %d states in memory  "
+                  "%d evicted" % (played, games, played / elapsed, updates / elapsed,
+                                  wins / float(played), len(table.utilities), table.evictions))
+    finally:
+        pool.close()
+        pool.join()
+        if shared is not None:
+            shared.close()
+    learner.writeFile()
+
+
+##
+# shareChanges
+# Description: Writes the states the learner changed this round into the shared table. If they
+# might not fit, the shared table is rebuilt instead from the learner's whole table, with room to
+# grow, and the old one is removed.
+#
+# Parameters:
+#   shared - The SharedUtilities the workers read from
+#   table - The learner's UtilityTable
+#   changed - The keys of the states that changed
+#   states - The fewest states the shared table should be able to hold
+#
+# Returns: The SharedUtilities the workers should read from next round
+##
+def shareChanges(shared, table, changed, states):
+    if shared.hasRoom(len(changed)):
+        shared.update([stateHash(key) for key in changed], [table.utilities[key] for key in changed])
+        return shared
+    rebuilt = SharedUtilities.fromTable(table, states)
+    shared.close()
+    return rebuilt
+
+
+##
+# evaluateWorker
+# Description: Plays a batch of evaluation games in a worker process. Our agent is frozen, so it
+# plays with the learned table (mapped from the utility file, shared by all workers) and weights
+# exactly as they are.
+#
+# Parameters:
+#   task - A tuple of (seed, games, opponent, side, dataDir, backend, maxTurns) where opponent is
+#          the module name of the AIPlayer to play and side the player id we play as
+#
+# Returns: [opponent, wins, losses, draws, moveTimes] where moveTimes are the seconds each of our
+#          moves took
+##
+def evaluateWorker(task):
+    seed, games, opponent, side, dataDir, backend, maxTurns = task
+    random.seed(seed)
+    if np is not None:
+        np.random.seed(seed % (2**32))
+    agent = AIPlayer(side, dataDir)
+    agent.frozen = True
+    agent.valueBackend = backend
+    agent.loadTable()
+    agents = [None, None]
+    agents[side] = agent
+    agents[1 - side] = makeAgent(1 - side, opponent)
+    moveTimes = [[], []]
+    wins = 0
+    losses = 0
+    for game in range(0, games):
+        winner, updates = playGame(agents, [False, False], maxTurns, moveTimes)
+        wins += 1 if winner == side else 0
+        losses += 1 if winner == 1 - side else 0
+        agent.endGame()
+    return opponent, wins, losses, games - wins - losses, moveTimes[side]
+
+
+##
+# evaluate
+# Description: Measures how well the learned table plays. Our frozen agent plays a round robin
+# against each opponent, half the games as player one and half as player two, on a pool of worker
+# processes. For each opponent it reports the win rate with its 95% Wilson confidence interval,
+# then the games played per second and the latency of our moves.
+#
+# Parameters:
+#   opponents - The module names of the AIPlayers to play against
+#   games - How many games to play against each opponent
+#   workers - How many worker processes to use
+#   gamesPerTask - How many games a worker plays per task
+#   backend - TABLE_BACKEND or LINEAR_BACKEND
+#   maxTurns - Moves after which a game is called a draw
+#   seed - The seed the games' seeds are drawn from
+#
+# Returns: A dictionary of opponent -> [wins, losses, draws]
+##
+def evaluate(opponents, games, workers, gamesPerTask, backend, maxTurns, seed):
+    dataDir = defaultDataDir()
+    seeds = random.Random(seed)
+    tasks = []
+    for opponent in opponents:
+        for side in (PLAYER_ONE, PLAYER_TWO):
+            sideGames = games // 2 if side == PLAYER_ONE else games - games // 2
+            for start in range(0, sideGames, gamesPerTask):
+                tasks.append((seeds.randint(0, 2**62), min(gamesPerTask, sideGames - start), opponent,
+                              side, dataDir, backend, maxTurns))
+
+    results = OrderedDict((opponent, [0, 0, 0]) for opponent in opponents)
+    moveTimes = []
+    start = time.time()
+    pool = multiprocessing.Pool(workers)
+    try:
+        for opponent, wins, losses, draws, times in pool.imap_unordered(evaluateWorker, tasks):
+            results[opponent][0] += wins
+            results[opponent][1] += losses
+            results[opponent][2] += draws
+            moveTimes.extend(times)
+    finally:
+        pool.close()
+        pool.join()
+    elapsed = time.time() - start
+
+    print("%-20s %7s %9s %17s %6s" % ('opponent', 'games', 'win rate', '95% interval', 'draws'))
+    for opponent, (wins, losses, draws) in results.items():
+        played = wins + losses + draws
+        low, high = wilsonInterval(wins, played)
+        print("%-20s %7d %9.3f    [%.3f, %.3f] %6d" %
+              (opponent, played, wins / float(played) if played else 0.0, low, high, draws))
+    moveTimes.sort()
+    print("%.1f games/sec  move latency p50 %.3f ms  p99 %.3f ms  max %.3f ms" %
+          (len(opponents) * games / elapsed, percentile(moveTimes, 0.5) * 1000,
+           percentile(moveTimes, 0.99) * 1000, (moveTimes[-1] if moveTimes else 0.0) * 1000))
+    return results
+
+
+##
+# wilsonInterval
+# Description: The Wilson score confidence interval of a win rate
+#
+# Parameters:
+#   wins - How many games were won
+#   games - How many games were played
+#   z - The standard score of the confidence level (1.96 for 95%)
+#
+# Returns: [low, high]
+##
+def wilsonInterval(wins, games, z=1.96):
+    if not games:
+        return 0.0, 1.0
+    rate = wins / float(games)
+    centre = (rate + z*z / (2*games)) / (1 + z*z / games)
+    spread = z * sqrt(rate*(1 - rate) / games + z*z / (4*games*games)) / (1 + z*z / games)
+    return max(0.0, centre - spread), min(1.0, centre + spread)
+
+
+##
+# learnFromEpisodes
+# Description: Offline learning. Streams the games logged in a directory (see EpisodeLogger)
+# through learnEpisode a number of times and writes out what was learned.
+#
+# Parameters:
+#   directory - The directory of episode logs
+#   backend - TABLE_BACKEND or LINEAR_BACKEND
+#   passes - How many times to go over the logged games
+##
+def learnFromEpisodes(directory, backend, passes):
+    if np is None:
+        raise ImportError("Episode logs need numpy")
+    learner = AIPlayer(PLAYER_ONE)
+    learner.valueBackend = backend
+    learner.loadTable()
+    start = time.time()
+    for learningPass in range(0, passes):
+        games = 0
+        turns = 0
+        for episode in readEpisodes(directory):
+            learner.learnEpisode(episode)
+            games += 1
+            turns += len(episode['key'])
+        elapsed = time.time() - start
+        print("pass %d/%d  %d games  %d turns  %.1f sec  %d states" %
+              (learningPass + 1, passes, games, turns, elapsed, len(learner.consolidatedState)))
+    learner.writeFile()
+
+
+##
+# syntheticState
+# Description: Builds a random but plausible play phase state for benchmarking. Each side gets
+# its anthill, tunnel, food and grass in its own territory, its queen on its anthill and the given
+# number of other ants anywhere on the board.
+#
+# Parameters:
+#   rng - The random.Random to draw the layout from
+#   numAnts - How many ants besides the queen each player has
+##
+def syntheticState(rng, numAnts):
+    currentState = GameState.getBasicState()
+    currentState.phase = PLAY_PHASE
+    currentState.whoseTurn = PLAYER_ONE
+    territories = ([(x, y) for x in range(BOARD_LENGTH) for y in range(0, 4)],
+                   [(x, y) for x in range(BOARD_LENGTH) for y in range(BOARD_LENGTH - 4, BOARD_LENGTH)])
+    neutral = currentState.inventories[NEUTRAL]
+    neutral.ants = []
+    neutral.constrs = []
+    taken = set()
+    for playerId in (PLAYER_ONE, PLAYER_TWO):
+        cells = rng.sample(territories[playerId], 7)
+        taken.update(cells)
+        inventory = currentState.inventories[playerId]
+        inventory.constrs = [Construction(cells[0], ANTHILL), Construction(cells[1], TUNNEL)]
+        inventory.ants = [Ant(cells[0], QUEEN, playerId)]
+        inventory.foodCount = rng.randint(0, FOOD_GOAL - 1)
+        neutral.constrs += [Construction(cells[2], FOOD), Construction(cells[3], FOOD)]
+        neutral.constrs += [Construction(coords, GRASS) for coords in cells[4:]]
+
+    free = [(x, y) for x in range(BOARD_LENGTH) for y in range(BOARD_LENGTH)
+            if (x, y) not in taken]
+    cells = rng.sample(free, 2 * numAnts)
+    for playerId in (PLAYER_ONE, PLAYER_TWO):
+        for coords in cells[playerId * numAnts:(playerId + 1) * numAnts]:
+            ant = Ant(coords, rng.choice((WORKER, DRONE, SOLDIER, R_SOLDIER)), playerId)
+            ant.carrying = ant.type == WORKER and rng.random() < 0.5
+            currentState.inventories[playerId].ants.append(ant)
+    return currentState
+
+
+##
+# syntheticTable
+# Description: Fills a utility table with random state keys for benchmarking
+#
+# Parameters:
+#   rng - The random.Random to draw the keys from
+#   size - How many states the table should hold
+##
+def syntheticTable(rng, size):
+    table = UtilityTable()
+    while len(table.utilities) < size:
+        key = tuple(rng.randint(0, 20) for i in range(0, 12))
+        table.set(key, rng.uniform(-100, 100))
+    return table
+
+
+##
+# timeCalls
+# Description: Times a function over a list of arguments
+#
+# Parameters:
+#   function - The function to time, called with one argument at a time
+#   arguments - The arguments to call it with
+#
+# Returns: The mean seconds per call
+##
+def timeCalls(function, arguments):
+    start = default_timer()
+    for argument in arguments:
+        function(argument)
+    return (default_timer() - start) / max(len(arguments), 1)
+
+
+##
+# benchmark
+# Description: Measures the agent on synthetic states: getMove latency against the number of legal
+# actions, tdLearning cost against table size, Consolidation throughput and writeFile/readFile
+# time against table size. The results are written to the baseline file if there isn't one yet
+# (or updateBaseline is set), otherwise they are compared against it. The agent keeps its files in
+# a temporary directory so our real files are left alone.
+#
+# Parameters:
+#   baselinePath - The JSON file holding the baseline results
+#   updateBaseline - Whether to overwrite the baseline with these results
+#   seed - The seed the synthetic states and tables are drawn from
+#   samples - How many states each measurement is averaged over
+##
+def benchmark(baselinePath, updateBaseline, seed, samples):
+    rng = random.Random(seed)
+    random.seed(seed)
+    results = OrderedDict()
+    workDir = tempfile.mkdtemp()
+    try:
+        agent = AIPlayer(PLAYER_ONE, workDir)
+        agent.loadTable()
+
+        for numAnts in (1, 2, 4, 8):
+            states = [syntheticState(rng, numAnts) for i in range(0, samples)]
+            actions = sum(len(listAllLegalMoves(state)) for state in states) / float(samples)
+            agent.consolidatedState = UtilityTable()
+            agent.transpositions = TranspositionCache(agent.transpositions.capacity)
+            seconds = timeCalls(agent.getMove, states)
+            results['getMove/ants=%d' % numAnts] = seconds
+            print("getMove        %2d ants  %6.1f actions  %8.3f ms" % (numAnts, actions, seconds * 1000))
+
+        pairs = [(syntheticState(rng, 4), syntheticState(rng, 4)) for i in range(0, samples)]
+        for size in (1000, 10000, 100000):
+            agent.consolidatedState = syntheticTable(rng, size)
+            agent.traces = {}
+            seconds = timeCalls(lambda pair: agent.tdLearning(*pair), pairs)
+            results['tdLearning/states=%d' % size] = seconds
+            print("tdLearning     %6d states       %8.3f ms" % (size, seconds * 1000))
+        agent.endGame()
+
+        states = [syntheticState(rng, 4) for i in range(0, samples)]
+        seconds = timeCalls(lambda state: Consolidation(state, PLAYER_ONE), states)
+        results['Consolidation'] = seconds
+        print("Consolidation                    %8.0f states/sec" % (1 / seconds))
+
+        for size in (1000, 10000, 100000):
+            agent.consolidatedState = syntheticTable(rng, size)
+            seconds = timeCalls(lambda agent: agent.writeFile(), [agent])
+            results['writeFile/states=%d' % size] = seconds
+            agent.consolidatedState = UtilityTable()
+            readSeconds = timeCalls(lambda agent: agent.readFile(), [agent])
+            results['readFile/states=%d' % size] = readSeconds
+            print("writeFile      %6d states       %8.3f ms  readFile %8.3f ms" %
+                  (size, seconds * 1000, readSeconds * 1000))
+    finally:
+        shutil.rmtree(workDir, ignore_errors=True)
+
+    environment = {'python': platform.python_version(), 'numpy': np is not None,
+                   'seed': seed, 'samples': samples}
+    if updateBaseline or not os.path.exists(baselinePath):
+        with open(baselinePath, 'w') as f:
+            json.dump({'environment': environment, 'results': results}, f, indent=2)
+        print("Wrote baseline to %s" % baselinePath)
+        return results
+
+    with open(baselinePath) as f:
+        baseline = json.load(f)
+    if baseline['environment'] != environment:
+        print("Warning: the baseline was measured with %s" % baseline['environment'])
+    print("%-24s %12s %12s %8s" % ('', 'baseline ms', 'now ms', 'ratio'))
+    for name, seconds in results.items():
+        before = baseline['results'].get(name)
+        if before:
+            print("%-24s %12.3f %12.3f %8.2f" % (name, before * 1000, seconds * 1000, seconds / before))
+    return results
+
+
+##
+# serveTable
+# Description: Loads our learned utilities into shared memory and keeps them there until
+# interrupted or terminated, so any number of agents on the host (for example in a tournament) look utilities
+# up in one copy instead of each loading their own. Agents use it when SHARED_TABLE_ENV is set to
+# the name printed here. They still keep what they learn themselves, and their utility log, on
+# top of it.
+#
+# Parameters:
+#   backend - TABLE_BACKEND or LINEAR_BACKEND
+##
+def serveTable(backend):
+    if np is None:
+        raise ImportError("Serving the utility table needs numpy")
+    # We load the table from the files, not from a table another process is serving
+    os.environ.pop(SHARED_TABLE_ENV, None)
+    agent = AIPlayer(PLAYER_ONE)
+    agent.frozen = True
+    agent.valueBackend = backend
+    agent.loadTable()
+    shared = SharedUtilities.fromTable(agent.consolidatedState, 0)
+    agent.consolidatedState = None
+    print("Serving %d states. Start the agents with %s=%s" % (len(shared), SHARED_TABLE_ENV, shared.name))
+    sys.stdout.flush()
+    # Being terminated removes the segment too
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shared.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Train the agent headlessly with self play or against "
+                                                 "another agent, learn from logged games, evaluate it "
+                                                 "or benchmark it. Run this from the AI directory.")
+    parser.add_argument('--games', type=int, default=1000, help="games to play")
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(), help="worker processes")
+    parser.add_argument('--games-per-task', type=int, default=10, help="games a worker plays per round")
+    parser.add_argument('--backend', choices=(TABLE_BACKEND, LINEAR_BACKEND), default=TABLE_BACKEND)
+    parser.add_argument('--opponent', default=None,
+                        help="module name of the AIPlayer to train against (default: self play)")
+    parser.add_argument('--max-turns', type=int, default=1000, help="moves before a game is a draw")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--capacity', type=int, default=None,
+                        help="most states the learned table keeps (default: no limit)")
+    parser.add_argument('--eviction', choices=EVICTION_POLICIES, default=EVICT_LEAST_RECENT,
+                        help="which states a full table forgets first")
+    parser.add_argument('--shared-states', type=int, default=None, metavar='N',
+                        help="share the table with the workers in memory, sized for N states, "
+                             "instead of through the utility file")
+    parser.add_argument('--async-learning', action='store_true',
+                        help="learn on a background thread instead of during each move")
+    parser.add_argument('--replay-batches', type=int, default=0,
+                        help="experience replay minibatches to learn from after each game")
+    parser.add_argument('--uniform-replay', action='store_true',
+                        help="sample replay minibatches uniformly instead of by TD error")
+    parser.add_argument('--benchmark', action='store_true',
+                        help="benchmark the agent on synthetic states instead of training")
+    parser.add_argument('--baseline', default='santilla18_kister19_benchmark.json',
+                        help="benchmark results to compare against (written if missing)")
+    parser.add_argument('--update-baseline', action='store_true',
+                        help="overwrite the baseline with this benchmark run")
+    parser.add_argument('--samples', type=int, default=50, help="states per benchmark measurement")
+    parser.add_argument('--evaluate', nargs='+', default=None, metavar='OPPONENT',
+                        help="instead of training, play --games frozen games against each of these "
+                             "AIPlayer modules and report win rates")
+    parser.add_argument('--learn-episodes', default=None, metavar='DIR',
+                        help="learn offline from the episode logs in DIR instead of training")
+    parser.add_argument('--passes', type=int, default=1, help="passes over the episode logs")
+    parser.add_argument('--serve-table', action='store_true',
+                        help="serve the learned table to the agents on this host in shared memory "
+                             "until interrupted (see %s)" % SHARED_TABLE_ENV)
+    args = parser.parse_args()
+    if args.benchmark:
+        benchmark(args.baseline, args.update_baseline, args.seed, args.samples)
+    elif args.evaluate is not None:
+        evaluate(args.evaluate, args.games, args.workers, args.games_per_task, args.backend,
+                 args.max_turns, args.seed)
+    elif args.learn_episodes is not None:
+        learnFromEpisodes(args.learn_episodes, args.backend, args.passes)
+    elif args.serve_table:
+        serveTable(args.backend)
+    else:
+        train(args.games, args.workers, args.games_per_task, args.backend, args.opponent,
+              args.max_turns, args.seed, args.replay_batches, not args.uniform_replay, args.capacity,
+              args.eviction, args.shared_states, args.async_learning)
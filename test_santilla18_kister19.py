@@ -0,0 +1,76 @@
+import os
+import random
+import shutil
+import tempfile
+
+import pytest
+
+np = pytest.importorskip('numpy')
+# The agent needs the Antics engine (Player, Constants, ...) on the path
+pytest.importorskip('Player')
+import santilla18_kister19 as agent
+
+
+def key(i):
+    return tuple([i] * agent.KEY_LENGTH)
+
+
+@pytest.fixture
+def dataDir():
+    directory = tempfile.mkdtemp()
+    yield directory
+    shutil.rmtree(directory)
+
+
+def test_trimmed_states_keep_their_learned_utilities(dataDir):
+    utilityPath = os.path.join(dataDir, agent.UTILITY_FILE)
+    logPath = os.path.join(dataDir, agent.UTILITY_LOG_FILE)
+    table = agent.UtilityTable()
+    for i in range(20):
+        table.set(key(i), 5.0)
+    table.save(utilityPath)
+
+    table.limit(10, agent.EVICT_LEAST_RECENT)
+    for i in range(20):
+        table.set(key(i), 7.0)
+    # Only the most recent states are logged before the trim, the states it forgets have to be
+    # logged by it
+    table.appendLog(logPath, [key(i) for i in range(15, 20)])
+    assert table.trim(logPath) > 0
+    for i in range(20):
+        assert table.get(key(i)) == 7.0
+    # The next checkpoint logs the states that are left
+    table.appendLog(logPath)
+
+    reloaded = agent.UtilityTable(agent.MappedUtilities(utilityPath))
+    reloaded.replayLog(logPath)
+    for i in range(20):
+        assert reloaded.get(key(i)) == 7.0
+
+
+def test_failed_async_batch_leaves_nothing_behind(dataDir):
+    player = agent.AIPlayer(agent.PLAYER_ONE, dataDir)
+    player.loadTable()
+    player.replay = agent.ReplayBuffer(100)
+    player.traces = {key(1): 1.0}
+    learner = agent.AsyncLearner(player, batchSize=10)
+    learnTransition = player.learnTransition
+    steps = []
+
+    def failSecondStep(*args):
+        steps.append(args)
+        if len(steps) == 2:
+            raise ValueError("second step")
+        learnTransition(*args)
+
+    player.learnTransition = failSecondStep
+    rng = random.Random(0)
+    batch = [(agent.syntheticState(rng, 2), key(10 + i), np.zeros(agent.NUM_FEATURES), (False, False))
+             for i in range(2)]
+    with pytest.raises(ValueError):
+        learner.learnBatch(batch)
+
+    assert len(steps) == 2
+    assert learner.published == {}
+    assert player.traces == {key(1): 1.0}
+    assert len(player.replay) == 0